@@ -0,0 +1,330 @@
+# SCRIPT: 	FontRig: fr-benchmark
+# NOTE: 	Benchmark the FontRig command line tools on synthetic fonts
+# -----------------------------------------------------------
+# (C) Vassil Kateliev, 2023 		(http://www.kateliev.com)
+#------------------------------------------------------------
+
+# No warranties. By using this you agree
+# that you use it at your own risk!
+
+# - Dependencies --------------------------------
+__requires__ = ['fontTools']
+
+import os, sys, argparse, json, csv, time, random, shutil, platform, statistics, subprocess, tempfile
+import importlib.util
+
+import fontTools
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from fontTools.pens.t2CharStringPen import T2CharStringPen
+
+# -- String -------------------------------------
+__version__ = 1.0
+
+tool_name = 'FR-BENCHMARK'
+tool_description = 'FontRig | Benchmark the FontRig command line tools on synthetic fonts'
+
+# -- Configuration
+tool_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cli', 'python')
+font_formats = ('ttf', 'otf')
+name_sizes = {'few':1, 'many':64} # - Number of languages with a full set of name records
+glyph_counts = (500, 5000, 65000)
+worker_counts = (1, 2, 4)
+random_seed = 2023
+
+# -- Windows language IDs used for the localized name records
+name_languages = [0x0409, 0x0407, 0x040c, 0x0410, 0x0c0a, 0x0413, 0x0416, 0x0419, 0x0411, 0x0412, 0x0804, 0x0404, 0x041d, 0x0406, 0x0414, 0x040b,
+				  0x0415, 0x0405, 0x040e, 0x0408, 0x041f, 0x0402, 0x0418, 0x041a, 0x041b, 0x0424, 0x0422, 0x0425, 0x0426, 0x0427, 0x040d, 0x0401,
+				  0x041e, 0x042a, 0x0421, 0x043e, 0x0439, 0x0445, 0x0449, 0x044a, 0x044b, 0x044c, 0x0447, 0x0446, 0x0436, 0x0403, 0x042d, 0x0456,
+				  0x0809, 0x0c09, 0x1009, 0x1409, 0x0c07, 0x0807, 0x080c, 0x0c0c, 0x100c, 0x0810, 0x0816, 0x080a, 0x2c0a, 0x0813, 0x0843, 0x0814]
+
+# - Helpers -------------------------------------
+def _output(i, message):
+	msg_type = ['DONE', 'WARN', 'INFO', 'ERROR']
+	print('{}:\t{}.'.format(msg_type[i], message), file=sys.stderr)
+
+def _load_tool(module_name, file_name):
+	'''Import a FontRig command line tool as a module, its CLI only runs as __main__'''
+	spec = importlib.util.spec_from_file_location(module_name, os.path.join(tool_path, file_name))
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+def _font_key(font_format, glyph_count, name_size):
+	return 'Bench-{}-{}-{}names'.format(glyph_count, font_format, name_size)
+
+fr_font_rename = _load_tool('fr_font_rename', 'fr-font-rename.py')
+fr_mod_v_metrics = _load_tool('fr_mod_v_metrics', 'fr-mod-v-metrics.py')
+
+# - Procedures -----------------------------------
+def build_font(file_path, font_format, glyph_count, name_size):
+	'''Synthetic font with glyph_count random outlines, reproducible for the same parameters'''
+	rnd = random.Random('{}-{}-{}'.format(random_seed, font_format, glyph_count))
+	is_ttf = font_format == 'ttf'
+	glyph_order = ['.notdef'] + ['g{:05d}'.format(i) for i in range(glyph_count - 1)]
+	glyphs = {}
+
+	for glyph_name in glyph_order:
+		pen = TTGlyphPen(None) if is_ttf else T2CharStringPen(600, None)
+
+		for contour in range(rnd.randint(1, 4)):
+			x, y = rnd.randint(0, 500), rnd.randint(-200, 700)
+			pen.moveTo((x, y))
+
+			if is_ttf:
+				pen.qCurveTo((x + 60, y + 120), (x + 140, y + 40))
+			else:
+				pen.curveTo((x + 40, y + 100), (x + 110, y + 100), (x + 140, y + 40))
+
+			pen.lineTo((x + 80, y - 90))
+			pen.closePath()
+
+		glyphs[glyph_name] = pen.glyph() if is_ttf else pen.getCharString()
+
+	family_name, style_name = 'Bench {}'.format(font_format.upper()), 'Regular'
+	font_builder = FontBuilder(1000, isTTF=is_ttf)
+	font_builder.setupGlyphOrder(glyph_order)
+	font_builder.setupCharacterMap({0x4e00 + i:glyph_name for i, glyph_name in enumerate(glyph_order[1:]) if 0x4e00 + i <= 0xffff})
+
+	if is_ttf:
+		font_builder.setupGlyf(glyphs)
+	else:
+		font_builder.setupCFF('Bench{}-{}'.format(font_format.upper(), style_name), {'FullName':'{} {}'.format(family_name, style_name), 'FamilyName':family_name}, glyphs, {})
+
+	font_builder.setupHorizontalMetrics({glyph_name:(600, 0) for glyph_name in glyph_order})
+	font_builder.setupHorizontalHeader(ascent=800, descent=-200)
+	font_builder.setupNameTable({'familyName':family_name, 'styleName':style_name, 'uniqueFontIdentifier':_font_key(font_format, glyph_count, name_size),
+								'fullName':'{} {}'.format(family_name, style_name), 'psName':'Bench{}-{}'.format(font_format.upper(), style_name), 'version':'Version 1.000'})
+	font_builder.setupOS2(sTypoAscender=800, sTypoDescender=-200, usWinAscent=1000, usWinDescent=300)
+	font_builder.setupPost()
+
+	# - Localized name records, on both platforms
+	name_table = font_builder.font['name']
+
+	for lang_id in name_languages[1:name_sizes[name_size]]:
+		for name_id in (0, 1, 2, 3, 4, 5, 6, 7):
+			name_table.setName('{} {:04x}'.format(name_table.getDebugName(name_id) or 'Bench', lang_id), name_id, 3, 1, lang_id)
+
+	font_builder.save(file_path)
+
+def time_phases(phases, repeat):
+	'''Run the (name, callable) phases in order, repeat times, and return the median time of each phase and the total'''
+	phase_times = {name:[] for name, _ in phases}
+	phase_times['total'] = []
+
+	for run in range(repeat):
+		state = {}
+
+		for name, phase in phases:
+			time_start = time.perf_counter()
+			phase(state)
+			phase_times[name].append(time.perf_counter() - time_start)
+
+		phase_times['total'].append(sum(phase_times[name][-1] for name, _ in phases))
+
+	return {name:round(statistics.median(times), 5) for name, times in phase_times.items()}
+
+def bench_metrics(font_path, out_path, mode, repeat):
+	'''FRfontMetrics (fontTools, full or lazy) or FRsfntMetrics (patch): load, edit and save'''
+	new_metrics = {'sTypoAscender':810, 'sTypoDescender':-210, 'ascent':810, 'descent':-210}
+
+	def load(state):
+		state['font'] = fr_mod_v_metrics.FRsfntMetrics(font_path) if mode == 'patch' else fr_mod_v_metrics.FRfontMetrics(font_path, lazy=mode == 'lazy')
+		state['font'].dump()
+
+	def edit(state):
+		state['font'].fromDict(new_metrics)
+
+	def save(state):
+		state['font'].save(out_path)
+		state['font'].close()
+
+	return time_phases([('load', load), ('edit', edit), ('save', save)], repeat)
+
+def bench_names(font_path, out_path, mode, repeat):
+	'''FRfontNames (fontTools or lazy raw name/CFF rewrite): load, edit and save'''
+	def load(state):
+		state['font'] = fr_font_rename.FRfontNames(font_path, lazy=mode == 'lazy')
+		state['font'].dump()
+
+	def edit(state):
+		state['font'].build_names('Bench Renamed', 'Bold')
+
+	def save(state):
+		state['font'].save(out_path)
+		state['font'].close()
+
+	return time_phases([('load', load), ('edit', edit), ('save', save)], repeat)
+
+def bench_batch(font_path, work_path, tool, workers, batch_size):
+	'''End to end CLI run over batch_size copies of a font, process start up included'''
+	batch_path = os.path.join(work_path, 'batch')
+	out_path = os.path.join(work_path, 'batch-out')
+	shutil.rmtree(batch_path, ignore_errors=True)
+	shutil.rmtree(out_path, ignore_errors=True)
+	os.makedirs(batch_path)
+	os.makedirs(out_path)
+	font_ext = os.path.splitext(font_path)[1]
+	batch_files = [os.path.join(batch_path, 'Batch-{:04d}{}'.format(i, font_ext)) for i in range(batch_size)]
+
+	for batch_file in batch_files:
+		shutil.copyfile(font_path, batch_file)
+
+	if tool == 'metrics':
+		command = [sys.executable, os.path.join(tool_path, 'fr-mod-v-metrics.py'), os.path.join(batch_path, '*' + font_ext), '-o', out_path, '-j', str(workers),
+					'--force', '--cache-file', os.path.join(work_path, 'cache.json'), '--sTypoAscender', '820']
+	else:
+		manifest_file = os.path.join(work_path, 'manifest.csv')
+
+		with open(manifest_file, 'w', newline='') as manifest:
+			manifest_writer = csv.writer(manifest)
+			manifest_writer.writerow(['file', 'name', 'style', 'output'])
+			manifest_writer.writerows([[batch_file, 'Bench Batch {}'.format(i), 'Bold', os.path.join(out_path, os.path.split(batch_file)[1])] for i, batch_file in enumerate(batch_files)])
+
+		command = [sys.executable, os.path.join(tool_path, 'fr-font-rename.py'), '--manifest', manifest_file, '-j', str(workers)]
+
+	time_start = time.perf_counter()
+	subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	batch_time = time.perf_counter() - time_start
+
+	return {'total':round(batch_time, 5), 'fonts_per_second':round(batch_size / batch_time, 2)}
+
+def compare_results(results, previous_results):
+	'''Ratio of new to previous total time of every benchmark present in both runs'''
+	result_key = lambda result: (result['benchmark'], result['mode'], result['font'], result.get('workers'))
+	previous_totals = {result_key(result):result['times']['total'] for result in previous_results['results']}
+
+	for result in results['results']:
+		previous_total = previous_totals.get(result_key(result))
+
+		if previous_total:
+			ratio = result['times']['total'] / previous_total
+			_output(1 if ratio > 1.1 else 2, '{} {} {}{}: {:.4f} s vs {:.4f} s ({:+.1f}%)'.format(result['benchmark'], result['mode'], result['font'],
+					' x{}'.format(result['workers']) if result.get('workers') else '', result['times']['total'], previous_total, (ratio - 1.)*100))
+
+# -- Setup CLI
+arg_parser = argparse.ArgumentParser(prog=tool_name, description=tool_description)
+
+arg_parser.add_argument('--glyphs', '-g',
+						type=int,
+						nargs='+',
+						default=list(glyph_counts),
+						metavar='N',
+						help='Glyph counts of the synthetic fonts (default: {})'.format(' '.join(map(str, glyph_counts))))
+
+arg_parser.add_argument('--formats', '-f',
+						type=str,
+						nargs='+',
+						choices=font_formats,
+						default=list(font_formats),
+						help='Font formats: TrueType (ttf) and CFF (otf)')
+
+arg_parser.add_argument('--names', '-n',
+						type=str,
+						nargs='+',
+						choices=name_sizes.keys(),
+						default=list(name_sizes.keys()),
+						help='Few (one language) or many (64 languages) name records')
+
+arg_parser.add_argument('--repeat', '-r',
+						type=int,
+						default=3,
+						metavar='N',
+						help='Runs per benchmark, the median is reported (default: 3)')
+
+arg_parser.add_argument('--workers', '-j',
+						type=int,
+						nargs='+',
+						default=list(worker_counts),
+						metavar='N',
+						help='Worker counts for the batch throughput benchmarks (default: {})'.format(' '.join(map(str, worker_counts))))
+
+arg_parser.add_argument('--batch-size', '-b',
+						type=int,
+						default=32,
+						metavar='N',
+						help='Fonts per batch throughput run, 0 skips the batch benchmarks (default: 32)')
+
+arg_parser.add_argument('--work-path', '-w',
+						type=str,
+						default=os.path.join(tempfile.gettempdir(), 'fontrig-benchmark'),
+						metavar='path',
+						help='Folder for the synthetic fonts, which are kept and reused between runs')
+
+arg_parser.add_argument('--output', '-o',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write the results in *.JSON format to path instead of stdout')
+
+arg_parser.add_argument('--compare', '-c',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Compare the results with those of a previous run (*.JSON)')
+
+arg_parser.add_argument('--version', '-v',
+						action="version",
+						version='{} | {} | VER. {}'.format(tool_name, tool_description, __version__),
+						help='Show tool version.')
+
+if __name__ == '__main__':
+	args = arg_parser.parse_args()
+	font_path = os.path.join(args.work_path, 'fonts')
+	out_path = os.path.join(args.work_path, 'out')
+
+	for path in (font_path, out_path):
+		os.makedirs(path, exist_ok=True)
+
+	# - Begin ----------------------------------------------------------
+	_output(2, 'FontRig | {} ver. {}'.format(tool_name, __version__))
+
+	results = {	'tool':tool_name,
+				'version':__version__,
+				'timestamp':time.strftime('%Y-%m-%dT%H:%M:%S'),
+				'system':{'python':platform.python_version(), 'fontTools':fontTools.version, 'platform':platform.platform(), 'cpu_count':os.cpu_count()},
+				'tools':{'fr-mod-v-metrics':fr_mod_v_metrics.__version__, 'fr-font-rename':fr_font_rename.__version__},
+				'params':{'repeat':args.repeat, 'batch_size':args.batch_size, 'seed':random_seed},
+				'results':[]
+			}
+
+	for font_format in args.formats:
+		for glyph_count in args.glyphs:
+			for name_size in args.names:
+				font_key = _font_key(font_format, glyph_count, name_size)
+				font_file = os.path.join(font_path, font_key + '.' + font_format)
+				out_file = os.path.join(out_path, font_key + '.' + font_format)
+
+				# -- Synthetic fonts are built once and reused
+				if not os.path.exists(font_file):
+					time_start = time.perf_counter()
+					build_font(font_file, font_format, glyph_count, name_size)
+					_output(0, 'Built font: {} in {:.2f} s'.format(font_file, time.perf_counter() - time_start))
+
+				font_info = {'format':font_format, 'glyphs':glyph_count, 'names':name_size, 'size':os.path.getsize(font_file)}
+				benchmarks = [('metrics', mode, bench_metrics) for mode in ('full', 'lazy', 'patch')] + [('names', mode, bench_names) for mode in ('full', 'lazy')]
+
+				for benchmark, mode, bench_function in benchmarks:
+					times = bench_function(font_file, out_file, mode, args.repeat)
+					results['results'].append({'benchmark':benchmark, 'mode':mode, 'font':font_key, 'font_info':font_info, 'times':times})
+					_output(2, '{} {} {}: {}'.format(benchmark, mode, font_key, ', '.join('{} {:.4f} s'.format(*item) for item in times.items())))
+
+				# -- Batch throughput, end to end through the command line tools
+				if args.batch_size > 0:
+					for tool in ('metrics', 'names'):
+						for workers in args.workers:
+							times = bench_batch(font_file, args.work_path, tool, workers, args.batch_size)
+							results['results'].append({'benchmark':'batch-' + tool, 'mode':'cli', 'font':font_key, 'font_info':font_info, 'workers':workers, 'times':times})
+							_output(2, 'batch-{} x{} {}: {:.4f} s, {} fonts/s'.format(tool, workers, font_key, times['total'], times['fonts_per_second']))
+
+	if args.output is not None:
+		with open(args.output, 'w') as json_tree:
+			json_tree.write(json.dumps(results, indent=4))
+
+		_output(0, 'Saved results: {}'.format(args.output))
+	else:
+		print(json.dumps(results, indent=4))
+
+	if args.compare is not None:
+		with open(args.compare, 'r') as json_tree:
+			compare_results(results, json.load(json_tree))
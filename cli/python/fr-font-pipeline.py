@@ -0,0 +1,245 @@
+# SCRIPT: 	FontRig: fr-font-pipeline
+# NOTE: 	Apply a chain of name, metrics and table edits to *.ttf or *.otf files
+# -----------------------------------------------------------
+# (C) Vassil Kateliev, 2023 		(http://www.kateliev.com)
+#------------------------------------------------------------
+
+# No warranties. By using this you agree
+# that you use it at your own risk!
+
+# - Dependencies --------------------------------
+__requires__ = ['fontTools']
+
+import os, sys, glob, argparse, json, time
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+from fontTools import ttLib
+
+# -- String -------------------------------------
+__version__ = 1.0
+
+tool_name = 'FR-FONT-PIPELINE'
+tool_description = 'FontRig | Apply a chain of name, metrics and table edits to *.ttf or *.otf files'
+
+# -- Configuration
+tool_path = os.path.dirname(os.path.abspath(__file__))
+pipeline_operations = ('names', 'metrics', 'table')
+
+# - Helpers -------------------------------------
+def _output(i, message):
+	msg_type = ['DONE', 'WARN', 'INFO', 'ERROR']
+	print('{}:\t{}.'.format(msg_type[i], message))
+
+def _load_tool(module_name, file_name):
+	'''Import a FontRig command line tool as a module, its CLI only runs as __main__'''
+	spec = importlib.util.spec_from_file_location(module_name, os.path.join(tool_path, file_name))
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+fr_font_rename = _load_tool('fr_font_rename', 'fr-font-rename.py')
+fr_mod_v_metrics = _load_tool('fr_mod_v_metrics', 'fr-mod-v-metrics.py')
+
+# - Clases --------------------------------------
+class FRfontPipeline(object):
+	'''Chain of edits applied to one loaded font (collection) and saved once. An operation is a dict:
+	{"op":"names", "name":str, "style":str, "platform":"all|win|mac"} - FRfontNames.build_names
+	{"op":"metrics", "metrics":{param:value}, "recalc_bounds":bool} - FRfontMetrics.fromDict
+	{"op":"table", "tag":str, "values":{attribute:value}} - any other decompiled table attribute'''
+
+	def __init__(self, file_path, font_number=None, font=None):
+		self.file_path = file_path
+
+		if font is None:
+			font = ttLib.TTCollection(file_path, shareTables=True) if fr_font_rename._is_collection(file_path) else ttLib.TTFont(file_path)
+
+		self.font = font
+
+		# - Both tool objects share the same open font
+		self.font_names = fr_font_rename.FRfontNames(file_path, font_number, font=self.font)
+		self.font_metrics = fr_mod_v_metrics.FRfontMetrics(file_path, font_number=font_number, font=self.font)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	# - Procedures
+	def apply(self, operation):
+		'''Apply a single operation to all selected faces'''
+		if operation.get('op') not in pipeline_operations:
+			raise ValueError('Unknown operation: {}'.format(operation.get('op')))
+
+		if operation['op'] == 'names':
+			self.font_names.platform_id = fr_font_rename.name_platforms[operation.get('platform', 'all')]
+
+			for number in self.font_names.faces():
+				self.font_names.build_names(operation['name'], operation.get('style') or '')
+
+		elif operation['op'] == 'metrics':
+			for number in self.font_metrics.faces():
+				if operation.get('recalc_bounds'):
+					self.font_metrics.recalcBounds()
+
+				self.font_metrics.fromDict(operation.get('metrics', {}))
+
+		elif operation['op'] == 'table':
+			for number in self.font_metrics.faces():
+				table = self.font_metrics.font[operation['tag']]
+
+				for attribute, value in operation['values'].items():
+					setattr(table, attribute, value)
+
+				# - Shared collection tables are only kept by the face that read them first
+				self.font_metrics.font[operation['tag']] = table
+
+	def run(self, operations):
+		for operation in operations:
+			self.apply(operation)
+
+	def dump(self):
+		return [{'font_number':number, 'names':dict(self.font_names.dump()), 'metrics':dict(self.font_metrics.dump())} for number, _ in zip(self.font_names.faces(), self.font_metrics.faces())]
+
+	def save(self, output_path=None):
+		self.font_names.save(output_path)
+
+	def close(self):
+		self.font.close()
+
+# - Procedures -----------------------------------
+def process_font(work_file, save_path, operations, font_number=None):
+	'''Run the pipeline on a single font file. Runs in a worker process with --jobs,
+	so all messages are collected into the returned result instead of printed.'''
+	time_start = time.perf_counter()
+	result = {'file':work_file, 'output':None, 'status':'saved', 'time':None, 'messages':[]}
+
+	try:
+		with FRfontPipeline(work_file, font_number) as font_pipeline:
+			font_pipeline.run(operations)
+			font_pipeline.save(save_path)
+
+		result['output'] = save_path
+		result['messages'].append((0, 'Saved Font: {}'.format(save_path)))
+
+	except (Exception, SystemExit) as the_error:
+		result['status'] = 'error'
+		result['messages'].append((3, 'Font: {}; {}'.format(work_file, the_error)))
+
+	result['time'] = round(time.perf_counter() - time_start, 4)
+	return result
+
+# -- Setup CLI
+arg_parser = argparse.ArgumentParser(prog=tool_name, description=tool_description)
+
+arg_parser.add_argument('File',
+						type=str,
+						metavar='font file(s)',
+						help='A *.ttf, *.otf, *.ttc or *.otc font file(s)')
+
+arg_parser.add_argument('--spec', '-s',
+						type=str,
+						metavar='path',
+						required=True,
+						help='Operations to apply, in order, as a list in *.JSON format')
+
+arg_parser.add_argument('--output-path', '-o',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Optional output folder')
+
+arg_parser.add_argument('--font-number', '-y',
+						type=int,
+						metavar='N',
+						required=False,
+						help='Process only font number N of a *.ttc or *.otc collection (default: all)')
+
+arg_parser.add_argument('--jobs', '-j',
+						type=int,
+						default=1,
+						metavar='N',
+						required=False,
+						help='Process fonts on a pool of N worker processes (0 = all CPUs)')
+
+arg_parser.add_argument('--log',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write a pipeline log in *.JSON format')
+
+arg_parser.add_argument('--version', '-v',
+						action="version",
+						version='{} | {} | VER. {}'.format(tool_name, tool_description, __version__),
+						help='Show tool version.')
+
+if __name__ == '__main__':
+	args = arg_parser.parse_args()
+
+	# -- Paths and configuration
+	font_files = sorted(glob.glob(args.File))
+	work_path = args.output_path if args.output_path is not None else os.path.split(font_files[0])[0] if len(font_files) else ''
+	worker_count = args.jobs if args.jobs > 0 else os.cpu_count()
+
+	# - Begin ----------------------------------------------------------
+	_output(2, 'FontRig | {} ver. {}'.format(tool_name, __version__))
+
+	try:
+		with open(args.spec, 'r') as json_tree:
+			operations = json.load(json_tree)
+
+		for operation in operations:
+			if operation.get('op') not in pipeline_operations:
+				raise ValueError('Unknown operation: {}'.format(operation.get('op')))
+
+	except (OSError, ValueError) as the_error:
+		_output(3, 'Spec: {}; Aborting'.format(the_error))
+		sys.exit(1)
+
+	if len(work_path) and not os.path.exists(work_path):
+		try:
+			os.makedirs(work_path)
+			_output(0, 'Creating folder: {}'.format(work_path))
+
+		except OSError:
+			_output(3, 'Creating folder: {}; Aborting'.format(work_path))
+			sys.exit(1)
+
+	# -- Process: results are streamed back in input order
+	executor = ProcessPoolExecutor(max_workers=worker_count) if worker_count > 1 else None
+	process_map = (lambda function, *iterables: fr_font_rename._bounded_map(executor, function, 2 * worker_count, *iterables)) if executor is not None else map
+	save_paths = [os.path.join(work_path, os.path.split(work_file)[1]) for work_file in font_files]
+	time_start = time.perf_counter()
+	pipeline_results = []
+
+	for result in process_map(process_font, font_files, save_paths, [operations]*len(font_files), [args.font_number]*len(font_files)):
+		for i, message in result.pop('messages'):
+			_output(i, message)
+
+		pipeline_results.append(result)
+
+	if executor is not None:
+		executor.shutdown()
+
+	pipeline_status = [result['status'] for result in pipeline_results]
+	pipeline_log = {	'tool':tool_name,
+						'version':__version__,
+						'spec':operations,
+						'jobs':worker_count,
+						'total':len(pipeline_results),
+						'saved':pipeline_status.count('saved'),
+						'failed':pipeline_status.count('error'),
+						'time':round(time.perf_counter() - time_start, 4),
+						'fonts':pipeline_results
+					}
+
+	_output(2, 'Processed: {total} fonts; Saved: {saved}; Failed: {failed}; Time: {time:.2f} s'.format(**pipeline_log))
+
+	if args.log is not None:
+		with open(args.log, 'w') as json_tree:
+			json_tree.write(json.dumps(pipeline_log, indent=4))
+
+		_output(0, 'Saved pipeline log: {}'.format(args.log))
+
+	sys.exit(1 if pipeline_log['failed'] else 0)
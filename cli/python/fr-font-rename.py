@@ -10,115 +10,534 @@
 # - Dependencies --------------------------------
 __requires__ = ['fontTools']
 
-import os, sys, argparse, json, pprint
-from inspect import getmembers
+import os, sys, glob, argparse, json, csv, time, struct, atexit, cProfile, pprint
+import importlib.util
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+# - fontTools import time is reported with --timings
+import_time = time.perf_counter()
 
 #from fontTools.misc.py23 import *
 from fontTools import ttLib
+from fontTools.ttLib.sfnt import SFNTWriter
+from fontTools.ttLib.tables.DefaultTable import DefaultTable
+from fontTools.cffLib import cffStandardStrings
+
+import_time = round(time.perf_counter() - import_time, 4)
+import_pid = os.getpid()
 
 # -- String -------------------------------------
-__version__ = 1.5
+__version__ = 2.4
 
 tool_name = 'FR-RENAME'
 tool_description = 'FontRig | Rename a *.ttf or *.otf file'
 
+# -- Configuration
+tool_path = os.path.dirname(os.path.abspath(__file__))
+name_platforms = {'all':None, 'win':3, 'mac':1}
+manifest_fields = ('file', 'name', 'style', 'output')
+stream_formats = ('jsonl', 'csv')
+timing_phases = ('import', 'parse', 'decompile', 'edit', 'compile', 'write')
+
+# -- Name properties read straight from the name records: property: nameID
+name_records = {'trademark':0, 'font_family_name':1, 'font_style_name':2, 'font_full_name':4, 'postscript_name':6}
+
+# -- Status messages go to stderr when stdout is used for streaming
+output_stream = sys.stdout
+
+# -- Background writer of fonts renamed in the main process, set by the CLI
+output_writer = None
+
+# -- CFF Top DICT operators: escaped (12 x) operators are stored as 1200 + x
+cff_name_operators = {'FullName':2, 'FamilyName':3}
+cff_offset_operators = {15:2, 16:1, 17:-1, 18:-1, 1236:-1, 1237:-1} # operator: largest predefined value (charset, Encoding), -1 if none
+cff_cid_operators = (1230, 1236) # ROS, FDArray: Font DICTs hold their own absolute offsets
+cff_sid_operators = (0, 1, 2, 3, 4, 1200, 1221, 1222) # version, Notice, FullName, FamilyName, Weight, Copyright, PostScript, BaseFontName
+
 # - Helpers -------------------------------------
 def _output(i, message):
 	msg_type = ['DONE', 'WARN', 'INFO', 'ERROR']
-	print('{}:\t{}.'.format(msg_type[i], message))
+	print('{}:\t{}.'.format(msg_type[i], message), file=output_stream)
+
+def _load_tool(module_name, file_name):
+	'''Import a FontRig command line tool as a module, its CLI only runs as __main__'''
+	spec = importlib.util.spec_from_file_location(module_name, os.path.join(tool_path, file_name))
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+# -- Atomic and background font writing is shared with FR-MOD-V-METRICS
+fr_mod_v_metrics = _load_tool('fr_mod_v_metrics', 'fr-mod-v-metrics.py')
+
+_bounded_map = fr_mod_v_metrics._bounded_map
+_write_atomic = fr_mod_v_metrics._write_atomic
+_committed = fr_mod_v_metrics._committed
+FRfontWriter = fr_mod_v_metrics.FRfontWriter
+
+def _is_collection(file_path):
+	with open(file_path, 'rb') as font_file:
+		return font_file.read(4) == b'ttcf'
+
+def _read_cff_index(data, offset):
+	'''Items of a CFF INDEX at offset and the offset right after it'''
+	count = struct.unpack_from('>H', data, offset)[0]
+
+	if count == 0:
+		return [], offset + 2
+
+	off_size = data[offset + 2]
+	offsets = [int.from_bytes(data[offset + 3 + i*off_size:offset + 3 + (i + 1)*off_size], 'big') for i in range(count + 1)]
+	data_start = offset + 3 + (count + 1)*off_size - 1
+	
+	return [bytes(data[data_start + offsets[i]:data_start + offsets[i + 1]]) for i in range(count)], data_start + offsets[-1]
+
+def _write_cff_index(items):
+	if not len(items):
+		return b'\x00\x00'
+
+	offsets = [1]
+
+	for item in items:
+		offsets.append(offsets[-1] + len(item))
+
+	off_size = max(1, (offsets[-1].bit_length() + 7) // 8)
+	return struct.pack('>HB', len(items), off_size) + b''.join(offset.to_bytes(off_size, 'big') for offset in offsets) + b''.join(items)
+
+def _encode_cff_int(value):
+	if -107 <= value <= 107:
+		return bytes([value + 139])
+	
+	elif 108 <= value <= 1131:
+		value -= 108
+		return bytes([(value >> 8) + 247, value & 0xff])
+	
+	elif -1131 <= value <= -108:
+		value = -value - 108
+		return bytes([(value >> 8) + 251, value & 0xff])
+	
+	elif -32768 <= value <= 32767:
+		return b'\x1c' + struct.pack('>h', value)
+	
+	return b'\x1d' + struct.pack('>l', value)
+
+def _read_cff_dict(data):
+	'''CFF DICT as a list of (operator, operands); operands are (raw bytes, integer value or None for reals)'''
+	cff_dict, operands, i = [], [], 0
+
+	while i < len(data):
+		b0 = data[i]
+
+		if b0 <= 21:
+			operator, i = (1200 + data[i + 1], i + 2) if b0 == 12 else (b0, i + 1)
+			cff_dict.append((operator, operands))
+			operands = []
+			continue
+
+		if b0 == 28:
+			size, value = 3, struct.unpack_from('>h', data, i + 1)[0]
+		elif b0 == 29:
+			size, value = 5, struct.unpack_from('>l', data, i + 1)[0]
+		elif b0 == 30:
+			size, value = 1, None
+			while data[i + size] & 0x0f != 0x0f and data[i + size] >> 4 != 0x0f:
+				size += 1
+			size += 1
+		elif 32 <= b0 <= 246:
+			size, value = 1, b0 - 139
+		elif 247 <= b0 <= 250:
+			size, value = 2, (b0 - 247)*256 + data[i + 1] + 108
+		elif 251 <= b0 <= 254:
+			size, value = 2, -(b0 - 251)*256 - data[i + 1] - 108
+		else:
+			raise ValueError('Invalid CFF DICT operand: {}'.format(b0))
 
-def _get_record(record_list, index):
-	for record in record_list:
-		if record.nameID == index:
-			return record.string.decode(record.getEncoding())
+		operands.append((bytes(data[i:i + size]), value))
+		i += size
 
-def _set_record(record_list, index, value):
-	for record in record_list:
-		if record.nameID == index:
-			record.string = value
+	return cff_dict
 
-def _get_properties(object):
-	return [name for name, value in getmembers(object, lambda x: isinstance(x, property))]
+def _take_import_time():
+	'''The fontTools import time is charged to the first font processed by a process.
+	A forked worker did not import anything, it only inherited the import time of its parent.'''
+	global import_time
+	taken_time, import_time = import_time, 0.
+	return taken_time if os.getpid() == import_pid else 0.
+
+def _format_timings(timings):
+	return ', '.join('{} {:.4f} s'.format(*item) for item in timings.items())
+
+def _load_manifest(file_path):
+	'''Read rename jobs from a *.CSV (with a header row) or *.JSON (list of objects) manifest.
+	Fields are: file, name, style and output; relative paths are resolved against the manifest folder.'''
+	manifest_path = os.path.split(os.path.abspath(file_path))[0]
+
+	with open(file_path, 'r', newline='') as manifest_file:
+		if os.path.splitext(file_path)[1].lower() == '.csv':
+			manifest = list(csv.DictReader(manifest_file))
+		else:
+			manifest = json.load(manifest_file)
+
+	rename_jobs = []
+
+	for entry in manifest:
+		if not entry.get('file') or not entry.get('name'):
+			raise ValueError('Manifest entry without file or name: {}'.format(entry))
+
+		rename_job = {field:entry.get(field) or None for field in manifest_fields}
+		rename_job['file'] = os.path.join(manifest_path, rename_job['file'])
+
+		if rename_job['output'] is not None:
+			rename_job['output'] = os.path.join(manifest_path, rename_job['output'])
+
+		rename_jobs.append(rename_job)
+
+	return rename_jobs
 
 # - Clases --------------------------------------
+class FRtimings(fr_mod_v_metrics.FRtimings):
+	'''Wall clock time spent in each processing phase, in seconds, starting with the fontTools import'''
+	
+	def __init__(self):
+		super(FRtimings, self).__init__()
+		self.phases['import'] = _take_import_time()
+
+class FRnameIndex(object):
+	'''Name records keyed by (nameID, platformID, platEncID, langID), built once per name table'''
+
+	def __init__(self, name_table):
+		self.records = {}
+		self.name_ids = {}
+
+		for record in name_table.names:
+			record_key = (record.nameID, record.platformID, record.platEncID, record.langID)
+			self.records[record_key] = record
+			self.name_ids.setdefault(record.nameID, []).append(record_key)
+
+	def get(self, name_id, platform_id=None):
+		'''First record string in name table order, of the given platform if it has one'''
+		record_keys = self.name_ids.get(name_id, [])
+		platform_keys = [record_key for record_key in record_keys if record_key[1] == platform_id]
+
+		for record_key in platform_keys or record_keys:
+			return self.records[record_key].toUnicode()
+
+	def values(self, platform_id=None):
+		'''Strings of all name IDs, read as get() does'''
+		return {name_id:self.get(name_id, platform_id) for name_id in self.name_ids.keys()}
+
+	def strings(self):
+		'''Strings of all name records, keyed nameID/platformID/platEncID/langID'''
+		return {'/'.join(str(key_item) for key_item in record_key):record.toUnicode() for record_key, record in self.records.items()}
+
+	def set(self, name_id, value, platform_id=None):
+		'''Update all existing records, or only those of the given platform'''
+		for record_key in self.name_ids.get(name_id, []):
+			if platform_id is None or record_key[1] == platform_id:
+				self.records[record_key].string = value
+
+class FRcffNames(object):
+	'''Raw CFF name editor: rewrites only the Name INDEX, the Top DICT and the String INDEX.
+	Offsets in the Top DICT are shifted by the size change, everything after the Global Subr INDEX
+	(charset, Encoding, CharStrings, Private DICTs and Subrs) is copied as raw bytes.'''
+
+	def __init__(self, cff_data):
+		if cff_data[0] != 1:
+			raise ValueError('CFF version {} not supported'.format(cff_data[0]))
+
+		self.data = cff_data
+		self.header = bytes(cff_data[:cff_data[2]])
+		self.fontNames, top_dict_offset = _read_cff_index(cff_data, len(self.header))
+		top_dicts, string_offset = _read_cff_index(cff_data, top_dict_offset)
+		self.strings, global_subrs_offset = _read_cff_index(cff_data, string_offset)
+		self.rest_offset = _read_cff_index(cff_data, global_subrs_offset)[1]
+		self.global_subrs = bytes(cff_data[global_subrs_offset:self.rest_offset])
+		self.fontNames = [font_name.decode('latin-1') for font_name in self.fontNames]
+		self.modified = False
+
+		if len(top_dicts) != 1:
+			raise ValueError('Multiple font CFF not supported')
+
+		self.top_dict = _read_cff_dict(top_dicts[0])
+
+		# - Only Top DICT offsets are shifted, all of them must point after the Global Subrs
+		for operator, operands in self.top_dict:
+			if operator in cff_cid_operators:
+				raise ValueError('CID-keyed CFF not supported')
+
+			if operator in cff_offset_operators and cff_offset_operators[operator] < operands[-1][1] < self.rest_offset:
+				raise ValueError('CFF data before the Global Subr INDEX not supported')
+
+	def __setattr__(self, name, value):
+		if name == 'fontNames':
+			value = [value] if isinstance(value, str) else list(value)
+			
+		if name in ('fontNames',) + tuple(cff_name_operators.keys()) and hasattr(self, 'modified'):
+			self.__dict__['modified'] = True
+
+		if name in cff_name_operators:
+			self._set_string(cff_name_operators[name], value)
+		else:
+			self.__dict__[name] = value
+
+	def __getattr__(self, name):
+		if name in cff_name_operators:
+			return self._get_string(cff_name_operators[name])
+
+		raise AttributeError(name)
+
+	# - Internals
+	def _get_string(self, operator):
+		for dict_operator, operands in self.top_dict:
+			if dict_operator == operator:
+				sid = operands[0][1]
+				return cffStandardStrings[sid] if sid < len(cffStandardStrings) else self.strings[sid - len(cffStandardStrings)].decode('latin-1')
+
+	def _get_sid(self, operator):
+		for dict_operator, operands in self.top_dict:
+			if dict_operator == operator:
+				return operands[0][1]
+
+	def _referenced_sids(self, skip_operator=None):
+		'''SIDs of the Top DICT strings (but skip_operator), the custom charset and the Encoding supplements'''
+		sids = set(operands[0][1] for operator, operands in self.top_dict if operator in cff_sid_operators and operator != skip_operator)
+		top_dict = dict(self.top_dict)
+		
+		if 17 not in top_dict:
+			return sids
+
+		glyph_count = struct.unpack_from('>H', self.data, top_dict[17][-1][1])[0]
+		
+		# - Charset: SIDs of the glyph names, .notdef is implied
+		if 15 in top_dict and top_dict[15][-1][1] > cff_offset_operators[15]:
+			offset = top_dict[15][-1][1]
+			charset_format, offset, covered = self.data[offset], offset + 1, 1
+
+			while covered < glyph_count:
+				if charset_format == 0:
+					sids.add(struct.unpack_from('>H', self.data, offset)[0])
+					offset, covered = offset + 2, covered + 1
+				else:
+					first_sid = struct.unpack_from('>H', self.data, offset)[0]
+					left_count = self.data[offset + 2] if charset_format == 1 else struct.unpack_from('>H', self.data, offset + 2)[0]
+					sids.update(range(first_sid, first_sid + left_count + 1))
+					offset, covered = offset + (3 if charset_format == 1 else 4), covered + left_count + 1
+
+		# - Encoding supplements: code to SID pairs after the codes or ranges
+		if 16 in top_dict and top_dict[16][-1][1] > cff_offset_operators[16]:
+			offset = top_dict[16][-1][1]
+			encoding_format = self.data[offset]
+
+			if encoding_format & 0x80:
+				offset += 2 + self.data[offset + 1] * (1 if encoding_format & 0x7f == 0 else 2)
+				sids.update(struct.unpack_from('>H', self.data, offset + 2 + 3*i)[0] for i in range(self.data[offset]))
+
+		return sids
+
+	def _set_string(self, operator, value):
+		'''Point the operator to an equal string, else reuse its own string if nothing else refers to it,
+		else append a new one. Unused strings at the end of the String INDEX are dropped, 
+		strings of other SIDs stay untouched, so repeated renames do not grow the String INDEX.'''
+		value_data = value.encode('latin-1')
+		sid = self._get_sid(operator)
+
+		if value in cffStandardStrings:
+			sid = cffStandardStrings.index(value)
+
+		elif value_data in self.strings:
+			sid = len(cffStandardStrings) + self.strings.index(value_data)
+
+		elif sid is not None and sid >= len(cffStandardStrings) and sid not in self._referenced_sids(operator):
+			self.strings[sid - len(cffStandardStrings)] = value_data
+
+		else:
+			self.strings.append(value_data)
+			sid = len(cffStandardStrings) + len(self.strings) - 1
+
+		operands = [(_encode_cff_int(sid), sid)]
+
+		for i, (dict_operator, _) in enumerate(self.top_dict):
+			if dict_operator == operator:
+				self.top_dict[i] = (operator, operands)
+				break
+		else:
+			self.top_dict.insert(0, (operator, operands))
+
+		referenced_sids = self._referenced_sids()
+
+		while len(self.strings) and len(cffStandardStrings) + len(self.strings) - 1 not in referenced_sids:
+			self.strings.pop()
+
+	def _compile_top_dict(self, delta):
+		'''Top DICT with all offsets shifted by delta, offsets are always 5 bytes long so its size does not depend on delta'''
+		top_dict = []
+
+		for operator, operands in self.top_dict:
+			operand_data = [raw for raw, value in operands]
+
+			if operator in cff_offset_operators and operands[-1][1] > cff_offset_operators[operator]:
+				operand_data[-1] = b'\x1d' + struct.pack('>l', operands[-1][1] + delta)
+
+			top_dict.append(b''.join(operand_data) + (bytes([12, operator - 1200]) if operator >= 1200 else bytes([operator])))
+
+		return b''.join(top_dict)
+
+	# - Procedures
+	def compile(self):
+		name_index = _write_cff_index([font_name.encode('latin-1') for font_name in self.fontNames])
+		string_index = _write_cff_index(self.strings)
+		top_dict_index = _write_cff_index([self._compile_top_dict(0)])
+		delta = len(self.header) + len(name_index) + len(top_dict_index) + len(string_index) + len(self.global_subrs) - self.rest_offset
+		top_dict_index = _write_cff_index([self._compile_top_dict(delta)])
+
+		return b''.join([self.header, name_index, top_dict_index, string_index, self.global_subrs, bytes(self.data[self.rest_offset:])])
+
 class FRfontNames(object):
 	'''Fonts Names Object for dealing with name tables'''
 
-	def __init__(self, file_path):
+	def __init__(self, file_path, font_number=None, platform_id=None, lazy=False, font=None):
 		self.file_path = file_path
-		self.font = ttLib.TTFont(self.file_path)
+		self.platform_id = platform_id
+		self.lazy = lazy
+		self.collection = None
+		self.messages = [] # - Collected, not printed: the font may be edited in a worker process
+		self.name_indexes = {}
+		self.cff_names = {}
+
+		# - Lazy mode: decompile only the name table, CFF names are edited in the raw CFF data.
+		# - All other tables, outlines included, are copied as raw bytes
+		font_options = {'lazy':True, 'recalcBBoxes':False, 'recalcTimestamp':False} if self.lazy else {}
+
+		# - Collections: all faces, or only the given font number, are edited. 
+		# - Tables shared between faces are parsed once and stay shared on save.
+		# - An already open font (collection) of file_path can be given instead
+		if font is not None and isinstance(font, ttLib.TTFont):
+			self.font_numbers = [0]
+			self.fonts = [font]
+		elif font is not None or _is_collection(self.file_path):
+			self.collection = font if font is not None else ttLib.TTCollection(self.file_path, shareTables=True, **font_options)
+			self.font_numbers = list(range(len(self.collection.fonts))) if font_number is None else [font_number]
+			self.fonts = [self.collection.fonts[number] for number in self.font_numbers]
+		else:
+			self.font_numbers = [0]
+			self.fonts = [ttLib.TTFont(self.file_path, **font_options)]
+
+		self.font = self.fonts[0]
 		self.is_cff = 'CFF ' in self.font
 		
+	# - Internals --------------------------------------
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def _name_index(self):
+		'''Name record index of the current font'''
+		if id(self.font) not in self.name_indexes:
+			# - A table shared between collection faces is only kept by the face that read it first
+			self.font['name'] = self.font['name']
+			self.name_indexes[id(self.font)] = FRnameIndex(self.font['name'])
+
+		return self.name_indexes[id(self.font)]
+
+	def _get_record(self, name_id):
+		return self._name_index().get(name_id, self.platform_id)
+
+	def _set_record(self, name_id, value):
+		self._name_index().set(name_id, value, self.platform_id)
+
+	def _cff_table(self):
+		'''(CFF font set, Top DICT) of the current font: the raw CFF name editor in lazy mode, 
+		fontTools for CFF data the editor can not handle or without lazy mode'''
+		if id(self.font) not in self.cff_names:
+			cff_names = None
+
+			if self.lazy:
+				try:
+					cff_names = FRcffNames(self.font.reader['CFF '])
+
+				except ValueError as the_error:
+					self.messages.append((1, '{}; Falling back to fontTools'.format(the_error)))
+
+			self.cff_names[id(self.font)] = cff_names
+
+		if self.cff_names[id(self.font)] is not None:
+			return self.cff_names[id(self.font)], self.cff_names[id(self.font)]
+
+		self.font['CFF '] = self.font['CFF ']
+		return self.font['CFF '].cff, self.font['CFF '].cff[0]
+
 	# - Properties -------------------------------------
 	@property
 	def cff_FamilyName(self):
 		if self.is_cff:
-			return	self.font['CFF '].cff[0].FamilyName
+			return	self._cff_table()[1].FamilyName
 
 	@cff_FamilyName.setter
 	def cff_FamilyName(self, value):
 		if self.is_cff:
-			self.font['CFF '].cff[0].FamilyName = value
+			self._cff_table()[1].FamilyName = value
 
 	@property
 	def cff_FullName(self):
 		if self.is_cff:
-			return	self.font['CFF '].cff[0].FullName
+			return	self._cff_table()[1].FullName
 
 	@cff_FullName.setter
 	def cff_FullName(self, value):
 		if self.is_cff:
-			self.font['CFF '].cff[0].FullName = value
+			self._cff_table()[1].FullName = value
 
 	@property
 	def cff_fontNames(self):
 		if self.is_cff:
-			return	self.font['CFF '].cff.fontNames
+			return	self._cff_table()[0].fontNames
 
 	@cff_fontNames.setter
 	def cff_fontNames(self, value):
 		if self.is_cff:
-			self.font['CFF '].cff.fontNames = value
+			self._cff_table()[0].fontNames = value
 
 	@property
 	def font_family_name(self):
-		return 	_get_record(self.font['name'].names, 1)
+		return 	self._get_record(1)
 
 	@font_family_name.setter
 	def font_family_name(self, value):
-		_set_record(self.font['name'].names, 1, value)
+		self._set_record(1, value)
 
 	@property
 	def font_style_name(self):
-		return 	_get_record(self.font['name'].names, 2)
+		return 	self._get_record(2)
 
 	@font_style_name.setter
 	def font_style_name(self, value):
-		_set_record(self.font['name'].names, 2, value)
+		self._set_record(2, value)
 
 	@property
 	def font_full_name(self):
-		return 	_get_record(self.font['name'].names, 4)
+		return 	self._get_record(4)
 
 	@font_full_name.setter
 	def font_full_name(self, value):
-		_set_record(self.font['name'].names, 4, value)
+		self._set_record(4, value)
 
 	@property
 	def postscript_name(self):
-		return 	_get_record(self.font['name'].names, 6)
+		return 	self._get_record(6)
 
 	@postscript_name.setter
 	def postscript_name(self, value):
-		_set_record(self.font['name'].names, 6, value.replace(' ', ''))
+		self._set_record(6, value.replace(' ', ''))
 
 	@property
 	def trademark(self):
-		return	_get_record(self.font['name'].names, 0)	
+		return	self._get_record(0)	
 
 	@trademark.setter
 	def trademark(self, value):
-		_set_record(self.font['name'].names, 0, value)	
+		self._set_record(0, value)	
 
 	# - Procedures ---------------------------------------
 	def build_names(self, name_string, style_string=''):
@@ -127,7 +546,7 @@ class FRfontNames(object):
 				style_string = self.font_style_name
 		
 			else:
-			 	output(3, 'Missing font style name\nQuitting...')
+			 	_output(3, 'Missing font style name\nQuitting...')
 			 	sys.exit(1)
 
 		self.font_family_name = name_string # what about ID16?
@@ -137,28 +556,180 @@ class FRfontNames(object):
 		if self.is_cff:
 		    self.cff_FamilyName = self.font_family_name
 		    self.cff_FullName = self.font_full_name
-		    self.cff_fontNames = self.postscript_name
+		    self.cff_fontNames = [self.postscript_name]
+
 
+	def faces(self):
+		'''Make each selected face of the font (collection) the current font in turn'''
+		for number, font in zip(self.font_numbers, self.fonts):
+			self.font = font
+			self.is_cff = 'CFF ' in self.font
+			yield number
+
+		self.font = self.fonts[0]
+		self.is_cff = 'CFF ' in self.font
+
+	def close(self):
+		'''Release the font data and the source file handles'''
+		if self.collection is not None:
+			self.collection.close()
+		else:
+			self.font.close()
+
+		self.fonts, self.font, self.collection = [], None, None
 
 	def save(self, output_path=None):
+		self.write(self.compile(), output_path)
+
+	def compile(self):
+		'''Binary data of the whole font (collection), compiled in memory'''
+		# - Edited raw CFF data goes in as a plain binary table
+		for font in self.fonts:
+			cff_names = self.cff_names.get(id(font))
+
+			if cff_names is not None and cff_names.modified:
+				font['CFF '] = DefaultTable('CFF ')
+				font['CFF '].data = cff_names.compile()
+
+		if self.lazy and self.collection is None:
+			return self._compile_lazy()
+
+		font_data = BytesIO()
+
+		if self.collection is not None:
+			self.collection.save(font_data, shareTables=True)
+		else:
+			self.font.save(font_data)
+
+		return font_data.getvalue()
+
+	def write(self, font_data, output_path=None):
+		'''Write compiled font data through a temporary file. Everything is read at this point, so it is safe to replace the source file'''
 		output_path = self.file_path if output_path is None else output_path
-		self.font.save(output_path)
+		_write_atomic(font_data, output_path)
+
+	def _compile_lazy(self):
+		'''Compile only the loaded tables, pass all other tables through as raw bytes.
+		Table checksums and the head checksum adjustment are recalculated by the writer.'''
+		font_tags = list(self.font.reader.keys())
+		font_data = BytesIO()
+		
+		writer = SFNTWriter(font_data, len(font_tags), self.font.sfntVersion, self.font.flavor, self.font.flavorData)
+
+		for tag in font_tags:
+			writer[tag] = self.font.getTableData(tag) if self.font.isLoaded(tag) else self.font.reader[tag]
+
+		writer.close()
+		return font_data.getvalue()
 	
 	def dump(self):
-		properties = _get_properties(FRfontNames)
-		return [(prop, getattr(self, prop)) for prop in properties]
+		'''All name properties; name record values are collected in one pass over the name index'''
+		record_values = self._name_index().values(self.platform_id)
+		return [(prop, record_values.get(name_records[prop]) if prop in name_records else getattr(self, prop)) for prop in name_properties]
 
 	def fromDict(self, names_dict:dict):
 		for item, value in names_dict.items():
 			self[item] = value
 
+# -- Name properties registry, built once for the CLI options and dump()
+name_properties = tuple(sorted(name for name, value in vars(FRfontNames).items() if isinstance(value, property)))
+
+# - Procedures -----------------------------------
+def dump_font(work_file, font_number=None, platform_id=None):
+	'''Name properties of all selected faces of a font file, one row per face. 
+	Read only, so the font is always opened lazily. Runs in a worker process with --jobs,
+	so a font that can not be read is reported in the returned messages instead of raised.'''
+	result = {'file':work_file, 'status':'streamed', 'rows':[], 'messages':[]}
+
+	try:
+		with FRfontNames(work_file, font_number, platform_id, lazy=True) as font_names_data:
+			face_label = lambda number: '{}#{}'.format(work_file, number) if font_names_data.collection is not None else work_file
+			result['rows'] = [dict([('file', face_label(number))] + font_names_data.dump()) for number in font_names_data.faces()]
+			result['messages'] += font_names_data.messages
+
+	except (Exception, SystemExit) as the_error:
+		result['status'] = 'error'
+		result['messages'].append((3, 'Font: {}; {}'.format(work_file, the_error)))
+
+	return result
+
+def rename_font(rename_job, font_number=None, platform_id=None, lazy=False, plan=False, timings=False):
+	'''Rename all selected faces of a single font file. Runs in a worker process with --jobs,
+	so all messages are collected into the returned result instead of printed.
+	A plan only records the old and new value of every changed name record and CFF name, nothing is saved.
+	With timings the result records the time spent in each phase: import, parse, decompile, edit, compile and write.'''
+	time_start = time.perf_counter()
+	font_timings = FRtimings()
+	result = dict(rename_job, status='unchanged', time=None, timings=None, messages=[])
+	font_save_path = rename_job['output'] if rename_job['output'] is not None else rename_job['file']
+	font_names_data = None
+
+	try:
+		# - A plan reads only the name table and the raw CFF names
+		with font_timings.phase('parse'):
+			font_names_data = FRfontNames(rename_job['file'], font_number, platform_id, lazy or plan)
+		
+		face_label = lambda number: '{}#{}'.format(rename_job['file'], number) if font_names_data.collection is not None else rename_job['file']
+		font_plan = []
+		
+		for number in font_names_data.faces():
+			if plan:
+				with font_timings.phase('decompile'):
+					names_current = dict(font_names_data._name_index().strings(), **{prop:value for prop, value in font_names_data.dump() if prop not in name_records})
+
+			with font_timings.phase('edit'):
+				font_names_data.build_names(rename_job['name'], rename_job['style'] or '')
+
+			if plan:
+				names_new = dict(font_names_data._name_index().strings(), **{prop:value for prop, value in font_names_data.dump() if prop not in name_records})
+				font_plan.append({'file':face_label(number), 'changes':{item:[names_current[item], value] for item, value in names_new.items() if names_current[item] != value}})
+
+		if plan:
+			result['plan'] = font_plan
+			result['status'] = 'planned'
+			return result
+
+		save_path = os.path.split(font_save_path)[0]
+		
+		if len(save_path) and not os.path.exists(save_path):
+			os.makedirs(save_path, exist_ok=True)
+
+		with font_timings.phase('compile'):
+			font_data = font_names_data.compile()
+
+		# - Without worker processes the write runs in the background, see _committed
+		with font_timings.phase('write'):
+			if output_writer is not None:
+				result['write'] = output_writer.submit(font_data, font_save_path)
+			else:
+				font_names_data.write(font_data, font_save_path)
+
+		result['output'] = font_save_path
+		result['status'] = 'saved'
+		result['messages'].append((0, 'Saved Font: {}'.format(font_save_path)))
+
+	except (Exception, SystemExit) as the_error:
+		result['status'] = 'error'
+		result['messages'].append((3, 'Font: {}; {}'.format(rename_job['file'], the_error)))
+
+	finally:
+		if font_names_data is not None:
+			result['messages'][:0] = font_names_data.messages
+			font_names_data.close()
+
+		result['time'] = round(time.perf_counter() - time_start, 4)
+		result['timings'] = font_timings.phases if timings else None
+
+	return result
+
 # -- Setup CLI
 arg_parser = argparse.ArgumentParser(prog=tool_name, description=tool_description)
 
 arg_parser.add_argument('File',
 						type=str,
+						nargs='?',
 						metavar='font file',
-						help='A *.ttf or *.otf font file(s)')
+						help='A *.ttf, *.otf, *.ttc or *.otc font file')
 						
 
 arg_parser.add_argument('--output-path', '-o',
@@ -179,6 +750,65 @@ arg_parser.add_argument('--style', '-s',
 						required=False,
 						help='Set new style name')
 
+arg_parser.add_argument('--font-number', '-y',
+						type=int,
+						metavar='N',
+						required=False,
+						help='Process only font number N of a *.ttc or *.otc collection (default: all)')
+
+arg_parser.add_argument('--platform', '-p',
+						type=str,
+						choices=name_platforms.keys(),
+						default='all',
+						required=False,
+						help='Name records to update: all platforms, Windows or Macintosh only')
+
+arg_parser.add_argument('--lazy', '-l',
+						action='store_true',
+						required=False,
+						help='Lazy mode: rewrite only the name table and CFF names; copy all other tables, outlines included, as raw bytes')
+
+arg_parser.add_argument('--manifest', '-m',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Rename all fonts listed in a *.CSV or *.JSON manifest with file, name, style and output fields')
+
+arg_parser.add_argument('--plan',
+						action='store_true',
+						required=False,
+						help='Dry run: write the old and new values of all name records to be changed as *.JSON, save nothing')
+
+arg_parser.add_argument('--plan-output',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write the plan to a file instead of stdout')
+
+arg_parser.add_argument('--timings',
+						action='store_true',
+						required=False,
+						help='Report the time spent on import, parse, decompile, edit, compile and write of every font')
+
+arg_parser.add_argument('--profile',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write cProfile statistics of the run (on a single process) to path')
+
+arg_parser.add_argument('--jobs', '-j',
+						type=int,
+						default=1,
+						metavar='N',
+						required=False,
+						help='Rename manifest fonts, plan or stream names on a pool of N worker processes (0 = all CPUs)')
+
+arg_parser.add_argument('--log',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write a manifest rename log in *.JSON format')
+
 arg_parser.add_argument('--report-names', '-r',
 						action='store_true',
 						required=False,
@@ -189,7 +819,19 @@ arg_parser.add_argument('--dump-names', '-d',
 						required=False,
 						help='Dump font names and name tables')
 
-for prop in _get_properties(FRfontNames):
+arg_parser.add_argument('--stream-names',
+						type=str,
+						choices=stream_formats,
+						required=False,
+						help='Stream font names of all fonts matching the font file pattern as one row per font')
+
+arg_parser.add_argument('--stream-output',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write the names stream to a file instead of stdout')
+
+for prop in name_properties:
 	arg_parser.add_argument('--{}'.format(prop),
 							type=str,
 							metavar='str',
@@ -201,58 +843,217 @@ arg_parser.add_argument('--version', '-v',
 						version='{} | {} | VER. {}'.format(tool_name, tool_description, __version__),
 						help='Show tool version.')
 
-args = arg_parser.parse_args()
+if __name__ == '__main__':
+	args = arg_parser.parse_args()
 
-# -- Paths and configuration
-font_file = args.File
-work_path = os.path.split(font_file)[0]
+	if args.File is None and args.manifest is None:
+		arg_parser.error('a font file or --manifest is required')
 
-# - Begin ----------------------------------------------------------
-_output(2, 'FontRig | {} ver. {}'.format(tool_name, __version__))
+	if args.stream_names is not None and args.File is None:
+		arg_parser.error('--stream-names requires a font file pattern')
 
-if not os.path.exists(work_path): 
-	try:
-		os.makedirs(work_path)
-		_output(0, 'Creating folder: {}'.format(work_path))
-	
-	except OSError:
-		the_error = 'Creating folder: {}; Aborting'.format(work_path)
-		_output(-1, the_error)
-		sys.exit(1)
-
-# -- Process
-font_names_data = FRfontNames(font_file)
-font_filename = os.path.split(font_file)[1]
-font_save_path = args.output_path if args.output_path else os.path.join(work_path, font_filename)
-
-changes_made = False
-
-# - Process
-if args.report_names:
-	report_string = '{deco}\nFont:\t{font}\n{deco}\n{names}\n'.format(deco='-'*40, font=font_filename, names='\n'.join(['{} : {}'.format(item[0],item[1]) for item in font_names_data.dump()]))
-	print(report_string)
+	if args.plan and args.manifest is None and args.name is None:
+		arg_parser.error('--plan requires --name or --manifest')
+
+	worker_count = args.jobs if args.jobs > 0 else os.cpu_count()
+	worker_count = 1 if args.profile is not None else worker_count # - Worker processes are not profiled
+	executor = ProcessPoolExecutor(max_workers=worker_count) if worker_count > 1 else None
+	process_map = (lambda function, *iterables: _bounded_map(executor, function, 2 * worker_count, *iterables)) if executor is not None else map
+	platform_id = name_platforms[args.platform]
+
+	# - The profile is saved on exit, whichever mode ran
+	if args.profile is not None:
+		profiler = cProfile.Profile()
+		atexit.register(lambda: (profiler.disable(), profiler.dump_stats(args.profile), _output(0, 'Saved profile: {}'.format(args.profile))))
+		profiler.enable()
+
+	# - Stream mode ---------------------------------------------------
+	if args.stream_names is not None:
+		font_files = sorted(glob.glob(args.File))
+
+		if args.stream_output is not None:
+			stream_file = open(args.stream_output, 'w', newline='')
+		else:
+			stream_file = sys.stdout
+			output_stream = sys.stderr
+
+		if args.stream_names == 'csv':
+			stream_writer = csv.DictWriter(stream_file, fieldnames=('file',) + name_properties)
+			stream_writer.writeheader()
+			stream_row = stream_writer.writerow
+		else:
+			stream_row = lambda row: stream_file.write(json.dumps(row) + '\n')
+
+		_output(2, 'FontRig | {} ver. {}'.format(tool_name, __version__))
+
+		for result in process_map(dump_font, font_files, [args.font_number]*len(font_files), [platform_id]*len(font_files)):
+			for row in result['rows']:
+				stream_row(row)
+
+			for i, message in result['messages']:
+				_output(i, message)
+
+		if executor is not None:
+			executor.shutdown()
+
+		if stream_file is not sys.stdout:
+			stream_file.close()
+			_output(0, 'Saved font names stream: {}'.format(args.stream_output))
+
+		sys.exit(0)
+
+	# - Manifest and plan mode ----------------------------------------
+	if args.manifest is not None or args.plan:
+		if args.plan and args.plan_output is None:
+			output_stream = sys.stderr
+
+		_output(2, 'FontRig | {} ver. {}'.format(tool_name, __version__))
+
+		try:
+			if args.manifest is not None:
+				rename_jobs = _load_manifest(args.manifest)
+			
+			else:
+				rename_jobs = [{'file':font_file, 'name':args.name, 'style':args.style, 'output':None} for font_file in sorted(glob.glob(args.File))]
 	
-elif args.dump_names:
-	font_names_data_dump_filename = os.path.join(work_path, os.path.splitext(font_filename)[0] + '-names-dump.json')
-	with open(font_names_data_dump_filename, 'w') as json_tree:
-		json_tree.write(json.dumps(font_names_data.dump()))
+		except (OSError, ValueError) as the_error:
+			_output(3, 'Manifest: {}; Aborting'.format(the_error))
+			sys.exit(1)
+
+		# -- Outputs not set in the manifest go to the output folder, if given
+		if args.output_path is not None:
+			for rename_job in rename_jobs:
+				if rename_job['output'] is None:
+					rename_job['output'] = os.path.join(args.output_path, os.path.split(rename_job['file'])[1])
+
+		time_start = time.perf_counter()
+		rename_results = []
+
+		rename_plan = []
+
+		# -- Without worker processes, fonts are written on a background thread while the next one is renamed
+		if executor is None and not args.plan:
+			output_writer = FRfontWriter()
+
+		for result in _committed(process_map(rename_font, rename_jobs, [args.font_number]*len(rename_jobs), [platform_id]*len(rename_jobs), [args.lazy]*len(rename_jobs), [args.plan]*len(rename_jobs), [args.timings]*len(rename_jobs)), 2):
+			for i, message in result.pop('messages'):
+				_output(i, message)
+
+			if result['timings'] is not None:
+				_output(2, 'Font: {} Timings: {}'.format(result['file'], _format_timings(result['timings'])))
+
+			rename_plan += result.pop('plan', [])
+			rename_results.append(result)
+
+		if executor is not None:
+			executor.shutdown()
+
+		if output_writer is not None:
+			output_writer.close()
+
+		if args.plan:
+			plan_file = open(args.plan_output, 'w') if args.plan_output is not None else sys.stdout
+			plan_file.write(json.dumps({'tool':tool_name, 'version':__version__, 'fonts':rename_plan}, indent=4) + '\n')
+
+			if plan_file is not sys.stdout:
+				plan_file.close()
+				_output(0, 'Saved rename plan: {}'.format(args.plan_output))
+
+		rename_status = [result['status'] for result in rename_results]
+		rename_log = {	'tool':tool_name,
+						'version':__version__,
+						'manifest':args.manifest,
+						'jobs':worker_count,
+						'total':len(rename_results),
+						'saved':rename_status.count('saved'),
+						'failed':rename_status.count('error'),
+						'time':round(time.perf_counter() - time_start, 4),
+						'timings':{phase:round(sum(result['timings'].get(phase, 0.) for result in rename_results if result['timings'] is not None), 4) for phase in timing_phases} if args.timings else None,
+						'fonts':rename_results
+					}
+
+		_output(2, '{action}: {count} of {total} fonts; Failed: {failed}; Time: {time:.2f} s'.format(action='Planned' if args.plan else 'Renamed', count=rename_status.count('planned') if args.plan else rename_log['saved'], **rename_log))
+
+		if args.log is not None:
+			with open(args.log, 'w') as json_tree:
+				json_tree.write(json.dumps(rename_log, indent=4))
+
+			_output(0, 'Saved rename log: {}'.format(args.log))
+
+		sys.exit(1 if rename_log['failed'] else 0)
+
+	# -- Paths and configuration
+	font_file = args.File
+	work_path = os.path.split(font_file)[0]
+
+	# - Begin ----------------------------------------------------------
+	_output(2, 'FontRig | {} ver. {}'.format(tool_name, __version__))
+
+	if len(work_path) and not os.path.exists(work_path): 
+		try:
+			os.makedirs(work_path)
+			_output(0, 'Creating folder: {}'.format(work_path))
 	
-	_output(0,'Saved font names dump: {}'.format(font_names_data_dump_filename))
+		except OSError:
+			the_error = 'Creating folder: {}; Aborting'.format(work_path)
+			_output(-1, the_error)
+			sys.exit(1)
+
+	# -- Process
+	font_timings = FRtimings()
+
+	with font_timings.phase('parse'):
+		font_names_data = FRfontNames(font_file, args.font_number, name_platforms[args.platform], args.lazy)
 	
-else:
-	if args.name is not None:
-		new_name = str(args.name)
-		new_style = str(args.style) if args.style is not None else ''
+	font_filename = os.path.split(font_file)[1]
+	font_save_path = args.output_path if args.output_path else os.path.join(work_path, font_filename)
+
+	# - Faces of collections are labeled with their font number
+	is_collection = font_names_data.collection is not None
+	face_label = lambda label, number: '{}#{}'.format(label, number) if is_collection else label
+
+	changes_made = False
+
+	# - Process
+	for font_number in font_names_data.faces():
+		with font_timings.phase('decompile'):
+			font_names_dump = font_names_data.dump()
+
+		if args.report_names:
+			report_string = '{deco}\nFont:\t{font}\n{deco}\n{names}\n'.format(deco='-'*40, font=face_label(font_filename, font_number), names='\n'.join(['{} : {}'.format(item[0],item[1]) for item in font_names_dump]))
+			print(report_string)
+		
+		elif args.dump_names:
+			font_names_data_dump_filename = os.path.join(work_path, face_label(os.path.splitext(font_filename)[0], font_number).replace('#', '-') + '-names-dump.json')
+			with open(font_names_data_dump_filename, 'w') as json_tree:
+				json_tree.write(json.dumps(font_names_dump))
 		
-		font_names_data.build_names(args.name, new_style)
-		changes_made = True
+			_output(0,'Saved font names dump: {}'.format(font_names_data_dump_filename))
+		
+		else:
+			if args.name is not None:
+				new_name = str(args.name)
+				new_style = str(args.style) if args.style is not None else ''
+			
+				with font_timings.phase('edit'):
+					font_names_data.build_names(args.name, new_style)
+				
+				changes_made = True
 
-# - Save changes
-if changes_made:
-	font_names_data.save(font_save_path)
-	_output(0,'Saved Font: {}'.format(font_save_path))
+	for i, message in font_names_data.messages:
+		_output(i, message)
 
+	# - Save changes
+	if changes_made:
+		with font_timings.phase('compile'):
+			font_data = font_names_data.compile()
 
+		with font_timings.phase('write'):
+			font_names_data.write(font_data, font_save_path)
 
-	
+		_output(0,'Saved Font: {}'.format(font_save_path))
+
+	font_names_data.close()
 
+	if args.timings:
+		_output(2, 'Font: {} Timings: {}'.format(font_file, _format_timings(font_timings.phases)))
@@ -0,0 +1,247 @@
+# SCRIPT: 	FontRig: fr-font-service
+# NOTE: 	Resident worker for font rename and metrics jobs
+# -----------------------------------------------------------
+# (C) Vassil Kateliev, 2023 		(http://www.kateliev.com)
+#------------------------------------------------------------
+
+# No warranties. By using this you agree
+# that you use it at your own risk!
+
+# - Dependencies --------------------------------
+__requires__ = ['fontTools']
+
+import os, sys, argparse, json, time, signal, socketserver
+import importlib.util
+from collections import OrderedDict
+
+from fontTools import ttLib
+
+# -- String -------------------------------------
+__version__ = 1.1
+
+tool_name = 'FR-FONT-SERVICE'
+tool_description = 'FontRig | Resident worker for font rename and metrics jobs'
+
+# -- Configuration
+tool_path = os.path.dirname(os.path.abspath(__file__))
+job_operations = ('names', 'metrics', 'table', 'pipeline', 'report', 'save', 'close')
+
+# -- Status messages never go to stdout, it carries the job results
+output_stream = sys.stderr
+
+# - Helpers -------------------------------------
+def _output(i, message):
+	msg_type = ['DONE', 'WARN', 'INFO', 'ERROR']
+	print('{}:\t{}.'.format(msg_type[i], message), file=output_stream)
+
+def _load_tool(module_name, file_name):
+	'''Import a FontRig command line tool as a module, its CLI only runs as __main__'''
+	spec = importlib.util.spec_from_file_location(module_name, os.path.join(tool_path, file_name))
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+def _file_stamp(file_path):
+	file_stat = os.stat(file_path)
+	return (file_stat.st_mtime_ns, file_stat.st_size)
+
+fr_font_pipeline = _load_tool('fr_font_pipeline', 'fr-font-pipeline.py')
+
+# - Clases --------------------------------------
+class FRfontCache(object):
+	'''LRU cache of open fonts (collections) keyed by file path.
+	A font is reloaded if its file changed on disk since it was opened.'''
+
+	def __init__(self, size=32):
+		self.size = size
+		self.fonts = OrderedDict()
+
+	def __contains__(self, file_path):
+		file_path = os.path.abspath(file_path)
+		return file_path in self.fonts and self.fonts[file_path][0] == _file_stamp(file_path)
+
+	def get(self, file_path):
+		'''Open font (collection) of file_path and whether it came from the cache'''
+		file_path = os.path.abspath(file_path)
+		cached = file_path in self
+
+		if cached:
+			self.fonts.move_to_end(file_path)
+		else:
+			self.evict(file_path)
+			font = ttLib.TTCollection(file_path, shareTables=True) if fr_font_pipeline.fr_font_rename._is_collection(file_path) else ttLib.TTFont(file_path)
+			self.fonts[file_path] = (_file_stamp(file_path), font)
+
+			while len(self.fonts) > self.size:
+				self.evict(next(iter(self.fonts)))
+
+		return self.fonts[file_path][1], cached
+
+	def refresh(self, file_path):
+		'''Keep the cached font of file_path valid after it was saved over its own file'''
+		file_path = os.path.abspath(file_path)
+
+		if file_path in self.fonts:
+			self.fonts[file_path] = (_file_stamp(file_path), self.fonts[file_path][1])
+
+	def evict(self, file_path):
+		file_path = os.path.abspath(file_path)
+
+		if file_path in self.fonts:
+			self.fonts.pop(file_path)[1].close()
+
+	def clear(self):
+		for file_path in list(self.fonts.keys()):
+			self.evict(file_path)
+
+class FRfontService(object):
+	'''Runs font jobs on cached fonts. A job is a JSON object:
+	{"id":any, "op":"names|metrics|table|pipeline|report|save|close", "file":path, "output":path, "save":bool, "font_number":int, ...}
+	names, metrics and table jobs carry the fields of the same FRfontPipeline operation,
+	pipeline jobs carry a list of them as "operations".
+	Edits are saved unless "save" is false, so a chain of jobs on the same font can be saved once.'''
+
+	def __init__(self, cache_size=32):
+		self.cache = FRfontCache(cache_size)
+
+	def run(self, job):
+		time_start = time.perf_counter()
+		timings = {}
+		result = {'id':None, 'op':None, 'file':None, 'status':'ok', 'output':None, 'cached':None, 'data':None, 'error':None, 'time':timings}
+		font = None
+
+		try:
+			result.update(id=job.get('id'), op=job.get('op'), file=job.get('file'))
+
+			if job.get('op') not in job_operations:
+				raise ValueError('Unknown operation: {}'.format(job.get('op')))
+
+			if job['op'] == 'close':
+				self.cache.evict(job['file'])
+				return result
+
+			time_phase = time.perf_counter()
+			font, result['cached'] = self.cache.get(job['file'])
+			timings['load'] = round(time.perf_counter() - time_phase, 4)
+
+			time_phase = time.perf_counter()
+			font_pipeline = fr_font_pipeline.FRfontPipeline(job['file'], job.get('font_number'), font=font)
+
+			if job['op'] in fr_font_pipeline.pipeline_operations:
+				font_pipeline.apply(job)
+
+			elif job['op'] == 'pipeline':
+				font_pipeline.run(job['operations'])
+
+			elif job['op'] == 'report':
+				result['data'] = font_pipeline.dump()
+
+			timings['edit'] = round(time.perf_counter() - time_phase, 4)
+
+			# - A font saved in place stays cached, one saved elsewhere no longer matches its own file
+			if job['op'] == 'save' or (job['op'] not in ('report',) and job.get('save', True)):
+				time_phase = time.perf_counter()
+				result['output'] = job.get('output') or job['file']
+				font_pipeline.save(result['output'])
+
+				if os.path.abspath(result['output']) == os.path.abspath(job['file']):
+					self.cache.refresh(job['file'])
+				else:
+					self.cache.evict(job['file'])
+
+				timings['save'] = round(time.perf_counter() - time_phase, 4)
+
+		except (Exception, SystemExit) as the_error:
+			# - Only a font the job got to may be left half edited
+			if font is not None:
+				self.cache.evict(job['file'])
+
+			result['status'] = 'error'
+			result['error'] = str(the_error)
+
+		timings['total'] = round(time.perf_counter() - time_start, 4)
+		return result
+
+	def serve(self, job_lines, write_result):
+		'''Run all jobs, one JSON object per line, writing each result as soon as it is done'''
+		for job_line in job_lines:
+			if not len(job_line.strip()):
+				continue
+
+			try:
+				job = json.loads(job_line)
+
+				if not isinstance(job, dict):
+					raise ValueError('not a JSON object')
+
+				result = self.run(job)
+
+			except ValueError as the_error:
+				result = {'id':None, 'status':'error', 'error':'Invalid job: {}'.format(the_error)}
+
+			write_result(json.dumps(result) + '\n')
+
+# -- Setup CLI
+arg_parser = argparse.ArgumentParser(prog=tool_name, description=tool_description)
+
+arg_parser.add_argument('--socket', '-u',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Serve jobs on a local Unix socket instead of stdin/stdout')
+
+arg_parser.add_argument('--cache-size', '-c',
+						type=int,
+						default=32,
+						metavar='N',
+						required=False,
+						help='Keep up to N recently used fonts open (default: 32)')
+
+arg_parser.add_argument('--version', '-v',
+						action="version",
+						version='{} | {} | VER. {}'.format(tool_name, tool_description, __version__),
+						help='Show tool version.')
+
+if __name__ == '__main__':
+	args = arg_parser.parse_args()
+	font_service = FRfontService(args.cache_size)
+
+	# - Begin ----------------------------------------------------------
+	_output(2, 'FontRig | {} ver. {}'.format(tool_name, __version__))
+
+	if args.socket is None:
+		def write_result(line):
+			sys.stdout.write(line)
+			sys.stdout.flush()
+
+		font_service.serve(sys.stdin, write_result)
+
+	else:
+		# - Connections are served one at a time, so all of them share the font cache
+		class FRjobHandler(socketserver.StreamRequestHandler):
+			def handle(self):
+				def write_result(line):
+					self.wfile.write(line.encode('utf-8'))
+					self.wfile.flush()
+
+				font_service.serve((line.decode('utf-8') for line in self.rfile), write_result)
+
+		if os.path.exists(args.socket):
+			os.remove(args.socket)
+
+		# - SIGTERM stops the service the same way as Ctrl+C
+		signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+		with socketserver.UnixStreamServer(args.socket, FRjobHandler) as job_server:
+			_output(2, 'Serving on: {}'.format(args.socket))
+
+			try:
+				job_server.serve_forever()
+
+			except KeyboardInterrupt:
+				pass
+
+		os.remove(args.socket)
+
+	font_service.cache.clear()
+	_output(0, 'Service stopped')
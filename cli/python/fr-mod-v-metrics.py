@@ -12,13 +12,19 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 __requires__ = ['fontTools']
 
-import os, glob, argparse, json
+import os, sys, glob, argparse, json, csv, struct, mmap, shutil, hashlib, tempfile, time, copy, cProfile
+from io import BytesIO
+from itertools import repeat
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 
-from fontTools.misc.py23 import *
-from fontTools import ttLib
+# -- fontTools is imported on demand by FRfontMetrics only, 
+# -- reading plain sfnt files through FRsfntMetrics does not need it.
+# -- NumPy is needed (and imported) only for recalculating the font bounds
 
 # -- String -------------------------------------
-__version__ = 1.6
+__version__ = 3.1
 
 tool_name = 'FR-MOD-V-METRICS'
 tool_description = 'FontRig | Modify the vertical metrics of a *.ttf or *.otf file'
@@ -39,33 +45,662 @@ lookup_dict = {	'sTypoAscender':'OS/2',
 				'unitsPerEm':'head',
 			}
 
+# -- Binary layout of the lookup_dict fields: offset in table, struct format
+lookup_struct = {	'sTypoAscender':(68, '>h'),
+					'sTypoDescender':(70, '>h'),
+					'usWinAscent':(74, '>H'),
+					'usWinDescent':(76, '>H'),
+					'sTypoLineGap':(72, '>h'),
+					'sxHeight':(86, '>h'),
+					'sCapHeight':(88, '>h'),
+					'ascent':(4, '>h'),
+					'descent':(6, '>h'),
+					'lineGap':(8, '>h'),
+					'yMax':(42, '>h'),
+					'yMin':(38, '>h'),
+					'unitsPerEm':(18, '>H'),
+				}
+
+sfnt_versions = (b'\x00\x01\x00\x00', b'OTTO', b'true')
+stream_formats = ('jsonl', 'csv')
+timing_phases = ('import', 'parse', 'decompile', 'edit', 'compile', 'write')
+metric_strategies = ('adobe', 'microsoft', 'google')
+cache_path = os.path.join(os.path.expanduser('~'), '.cache', 'fontrig', 'fr-mod-v-metrics-cache.json')
+
+# -- Status messages go to stderr when stdout is used for streaming
+output_stream = sys.stdout
+
+# -- Background writer of fonts processed in the main process, set by the CLI
+output_writer = None
+
+# -- Permissions of new output files, temporary files are created private
+file_umask = os.umask(0)
+os.umask(file_umask)
+
 # - Helpers -------------------------------------
 def _output(i, message):
 	msg_type = ['DONE', 'WARN', 'INFO', 'ERROR']
-	print('{}:\t{}.'.format(msg_type[i], message))
+	print('{}:\t{}.'.format(msg_type[i], message), file=output_stream)
+
+def _calc_checksum(data):
+	data += b'\0' * (-len(data) % 4)
+	return sum(struct.unpack('>{}L'.format(len(data) // 4), data)) & 0xffffffff
+
+def _reset_peak_rss():
+	'''Reset the peak resident set size (Linux only), so that it can be measured per font'''
+	try:
+		with open('/proc/self/clear_refs', 'w') as proc_file:
+			proc_file.write('5')
+	
+	except OSError:
+		pass
+
+def _peak_rss():
+	'''Peak resident set size in MB: since the last reset on Linux, of the whole process elsewhere'''
+	try:
+		with open('/proc/self/status', 'r') as proc_file:
+			for line in proc_file:
+				if line.startswith('VmHWM:'):
+					return round(int(line.split()[1]) / 1024., 1)
+	
+	except OSError:
+		pass
+
+	try:
+		import resource
+		peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		return round(peak_rss / (1024. * 1024. if sys.platform == 'darwin' else 1024.), 1)
+	
+	except ImportError:
+		return None
+
+def _bounded_map(executor, function, limit, *iterables):
+	'''Same as executor.map, but keeps at most limit tasks submitted and not yet consumed'''
+	pending = deque()
+
+	for arguments in zip(*iterables):
+		if len(pending) >= limit:
+			yield pending.popleft().result()
+
+		pending.append(executor.submit(function, *arguments))
+
+	while len(pending):
+		yield pending.popleft().result()
+
+def _file_stamp(file_path):
+	file_stat = os.stat(file_path)
+	return [file_stat.st_mtime_ns, file_stat.st_size]
+
+def _file_hash(file_path):
+	file_hash = hashlib.sha1()
+
+	with open(file_path, 'rb') as font_file:
+		for chunk in iter(lambda: font_file.read(1 << 20), b''):
+			file_hash.update(chunk)
+
+	return file_hash.hexdigest()
+
+@contextmanager
+def _atomic_output(output_path):
+	'''Temporary file next to output_path, moved over it only once the block completes.
+	A failed or interrupted write leaves any existing output_path untouched.'''
+	temp_handle, temp_path = tempfile.mkstemp(prefix='.{}.'.format(os.path.basename(output_path)), suffix='.tmp', dir=os.path.dirname(os.path.abspath(output_path)))
+	os.close(temp_handle)
+
+	try:
+		yield temp_path
+
+		if os.path.exists(output_path):
+			shutil.copymode(output_path, temp_path)
+		else:
+			os.chmod(temp_path, 0o666 & ~file_umask)
+
+		os.replace(temp_path, output_path)
+	
+	except BaseException:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+
+		raise
+
+def _write_atomic(font_data, output_path):
+	with _atomic_output(output_path) as temp_path:
+		with open(temp_path, 'wb') as font_file:
+			font_file.write(font_data)
+			font_file.flush()
+			os.fsync(font_file.fileno())
+
+def _commit_result(result):
+	'''Wait for the background write of a result, a failed write turns it into an error'''
+	write_future = result.pop('write', None)
+
+	if write_future is not None:
+		try:
+			write_time = write_future.result()
+
+			if result['timings'] is not None:
+				result['timings']['write'] = round(result['timings'].get('write', 0.) + write_time, 4)
+
+		except Exception as the_error:
+			result['messages'] = [(i, message) for i, message in result['messages'] if i != 0] + [(-1, 'Font: {}; {}'.format(result['file'], the_error))]
+			result['status'] = 'error'
+			result['output'] = None
+
+			# - A cached result would vouch for an output that was never written
+			if 'cache' in result:
+				result['cache'] = None
+
+	return result
+
+def _committed(results, limit):
+	'''Yield results in input order once their output is written, 
+	up to limit results wait for their writes while the next fonts are processed'''
+	pending = deque()
+
+	for result in results:
+		pending.append(result)
+
+		if len(pending) > limit:
+			yield _commit_result(pending.popleft())
+
+	while len(pending):
+		yield _commit_result(pending.popleft())
+
+def _load_cache(file_path):
+	try:
+		with open(file_path, 'r') as json_tree:
+			cache = json.load(json_tree)
+	
+	except (OSError, ValueError):
+		cache = {}
+
+	# - Entries written by other tool versions are discarded
+	return cache if cache.get('version') == __version__ else {'version':__version__}
+
+def _save_cache(file_path, cache):
+	cache_folder = os.path.dirname(file_path)
+
+	if len(cache_folder):
+		os.makedirs(cache_folder, exist_ok=True)
+
+	# - The cache is shared between runs, each one writes through its own temporary file
+	with _atomic_output(file_path) as temp_path:
+		with open(temp_path, 'w') as json_tree:
+			json_tree.write(json.dumps(cache))
+
+def _result_key(input_path, output_path):
+	'''Results are cached per input and output, runs into other folders keep their own entries'''
+	return '{}\n{}'.format(os.path.abspath(input_path), os.path.abspath(output_path))
+
+def _is_collection(file_path):
+	with open(file_path, 'rb') as font_file:
+		return font_file.read(4) == b'ttcf'
+
+def _read_face_offsets(data):
+	'''Returns the table directory offsets of all faces in a font collection or (0,) for a single font'''
+	if data[:4] != b'ttcf':
+		return (0,)
+
+	num_fonts = struct.unpack_from('>L', data, 8)[0]
+	return struct.unpack_from('>{}L'.format(num_fonts), data, 12)
+
+def _read_sfnt_directory(data, directory_offset=0):
+	'''Returns {tag: (record offset, checksum, table offset, table length)} of a sfnt table directory'''
+	num_tables = struct.unpack_from('>H', data, directory_offset + 4)[0]
+	directory = {}
+
+	for i in range(num_tables):
+		record = directory_offset + 12 + 16 * i
+		tag, checksum, offset, length = struct.unpack_from('>4sLLL', data, record)
+		directory[tag.decode('latin-1')] = (record, checksum, offset, length)
+
+	return directory
+
+# - Bounds --------------------------------------
+class FRboundsPen(object):
+	'''Minimal pen collecting the on-curve Y values and cubic Y segments 
+	of any number of glyphs into flat lists for batch processing'''
+
+	def __init__(self, glyph_set=None):
+		self.glyph_set = glyph_set
+		self.points, self.curves = [], []
+		self.current, self.y_offset = 0, 0
+
+	def moveTo(self, pt):
+		self.current = pt[1] + self.y_offset
+		self.points.append(self.current)
+
+	def lineTo(self, pt):
+		self.moveTo(pt)
+
+	def curveTo(self, pt1, pt2, pt3):
+		self.curves.append((self.current, pt1[1] + self.y_offset, pt2[1] + self.y_offset, pt3[1] + self.y_offset))
+		self.moveTo(pt3)
+
+	def closePath(self):
+		pass
+
+	def endPath(self):
+		pass
+
+	def addComponent(self, glyph_name, transformation):
+		# - CFF seac accents: translation only
+		self.y_offset += transformation[5]
+		self.glyph_set[glyph_name].draw(self)
+		self.y_offset -= transformation[5]
+
+def _glyf_coordinates(glyf_data, offset, contour_count):
+	'''(x, y) coordinate arrays of the simple glyf glyph at offset'''
+	import numpy as np
+
+	end_points = struct.unpack_from('>{}H'.format(contour_count), glyf_data, offset + 10)
+	point_count = end_points[-1] + 1
+	position = offset + 10 + 2*contour_count
+	position += 2 + struct.unpack_from('>H', glyf_data, position)[0]
+
+	# - Flags: bit 3 repeats a flag the number of times given by the next byte
+	flags = bytearray()
+
+	while len(flags) < point_count:
+		flag = glyf_data[position]
+		repeat_count = glyf_data[position + 1] + 1 if flag & 0x08 else 1
+		flags.extend(bytes([flag]) * repeat_count)
+		position += 2 if flag & 0x08 else 1
+
+	flags = np.frombuffer(bytes(flags[:point_count]), dtype=np.uint8)
+	glyf = np.frombuffer(glyf_data, dtype=np.uint8)
+	coordinates = []
+
+	# - Short coordinates are one unsigned byte with a sign flag, others are int16 or the previous value repeated
+	for short_flag, same_flag in ((0x02, 0x10), (0x04, 0x20)):
+		is_short, is_same = (flags & short_flag) > 0, (flags & same_flag) > 0
+		sizes = np.where(is_short, 1, np.where(is_same, 0, 2))
+		starts = position + np.concatenate(([0], np.cumsum(sizes)[:-1]))
+		deltas = np.zeros(point_count, dtype=np.int64)
+		deltas[is_short] = np.where(is_same[is_short], 1, -1) * glyf[starts[is_short]]
+		is_word = sizes == 2
+		deltas[is_word] = ((glyf[starts[is_word]].astype(np.int64) << 8 | glyf[starts[is_word] + 1]) ^ 0x8000) - 0x8000
+		coordinates.append(np.cumsum(deltas))
+		position += int(sizes.sum())
+
+	return coordinates
+
+def _glyf_vertical_bounds(glyf_data, loca_data, long_offsets):
+	'''Font-wide (yMin, yMax) of the outline coordinates of all glyf glyphs, composites are 
+	resolved through their transformed components. The stored glyph bounding boxes are not
+	used, they may be stale - which is what recalculating the bounds is meant to fix.'''
+	import numpy as np
+
+	loca_type = '>u4' if long_offsets else '>u2'
+	loca_size = len(loca_data) // np.dtype(loca_type).itemsize
+	loca = np.frombuffer(loca_data, dtype=loca_type, count=loca_size).astype(np.int64)
+	loca = (loca if long_offsets else loca * 2).tolist()
+	glyph_points = {}
+
+	def points(glyph_id):
+		'''(x, y) coordinate arrays of a glyph, with all of its components'''
+		if glyph_id in glyph_points:
+			return glyph_points[glyph_id]
+
+		offset, end = loca[glyph_id], loca[glyph_id + 1]
+		glyph_points[glyph_id] = empty = (np.zeros(0), np.zeros(0))
+
+		if end - offset < 10 or end > len(glyf_data):
+			return empty
+
+		contour_count = struct.unpack_from('>h', glyf_data, offset)[0]
+
+		if contour_count > 0:
+			glyph_points[glyph_id] = _glyf_coordinates(glyf_data, offset, contour_count)
+		
+		elif contour_count < 0:
+			x_parts, y_parts, position, flags = [], [], offset + 10, 0x20
+
+			while flags & 0x20:
+				flags, component_id = struct.unpack_from('>HH', glyf_data, position)
+				position += 4
+				
+				# - Offsets (ARGS_ARE_XY_VALUES), else point numbers to be matched: the stored bounds are used then
+				if flags & 0x01:
+					dx, dy = struct.unpack_from('>hh' if flags & 0x02 else '>HH', glyf_data, position)
+					position += 4
+				else:
+					dx, dy = struct.unpack_from('>bb' if flags & 0x02 else '>BB', glyf_data, position)
+					position += 2
+
+				scale_a, scale_b, scale_c, scale_d = 1., 0., 0., 1.
+
+				if flags & 0x08:
+					scale_a = scale_d = struct.unpack_from('>h', glyf_data, position)[0] / 16384.
+					position += 2
+				elif flags & 0x40:
+					scale_a, scale_d = [value / 16384. for value in struct.unpack_from('>hh', glyf_data, position)]
+					position += 4
+				elif flags & 0x80:
+					scale_a, scale_b, scale_c, scale_d = [value / 16384. for value in struct.unpack_from('>hhhh', glyf_data, position)]
+					position += 8
+
+				if not flags & 0x02:
+					y_min, y_max = struct.unpack_from('>h', glyf_data, offset + 4)[0], struct.unpack_from('>h', glyf_data, offset + 8)[0]
+					glyph_points[glyph_id] = (np.zeros(2), np.array([y_min, y_max], dtype=np.float64))
+					return glyph_points[glyph_id]
+
+				# - SCALED_COMPONENT_OFFSET: the offset is transformed too
+				if flags & 0x800 and not flags & 0x1000:
+					dx, dy = scale_a*dx + scale_c*dy, scale_b*dx + scale_d*dy
+
+				if component_id + 1 < len(loca):
+					x, y = points(component_id)
+					x_parts.append(scale_a*x + scale_c*y + dx)
+					y_parts.append(scale_b*x + scale_d*y + dy)
+
+			if len(y_parts):
+				glyph_points[glyph_id] = (np.concatenate(x_parts), np.concatenate(y_parts))
+
+		return glyph_points[glyph_id]
+
+	y_values = [points(glyph_id)[1] for glyph_id in range(len(loca) - 1)]
+	y_values = [y for y in y_values if len(y)]
+
+	if not len(y_values):
+		return None
+
+	return int(np.floor(min(y.min() for y in y_values))), int(np.ceil(max(y.max() for y in y_values)))
+
+def _cff_vertical_bounds(cff_data, ot_font=None):
+	'''Font-wide (yMin, yMax) of all CFF charstrings, with exact cubic extrema solved in batch'''
+	import numpy as np
+	from fontTools import cffLib
+
+	cff = cffLib.CFFFontSet()
+	cff.decompile(BytesIO(cff_data), ot_font)
+	char_strings = cff.topDictIndex[0].CharStrings
+	
+	bounds_pen = FRboundsPen(char_strings)
+
+	for glyph_name in char_strings.keys():
+		char_strings[glyph_name].draw(bounds_pen)
+
+	if not len(bounds_pen.points):
+		return None
+
+	points = np.asarray(bounds_pen.points, dtype=np.float64)
+	y_min, y_max = points.min(), points.max()
+
+	if len(bounds_pen.curves):
+		# - Only curves with off-curve points outside the on-curve extents can extend them
+		curves = np.asarray(bounds_pen.curves, dtype=np.float64)
+		curves = curves[(curves[:,1:3].min(axis=1) < y_min) | (curves[:,1:3].max(axis=1) > y_max)]
+		p0, p1, p2, p3 = curves.T
+
+		# - Roots of the derivative: a*t^2 + b*t + c = 0
+		a = -p0 + 3*p1 - 3*p2 + p3
+		b = 2*(p0 - 2*p1 + p2)
+		c = p1 - p0
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			quadratic = np.abs(a) > 1e-12
+			disc_root = np.sqrt(np.where(b*b - 4*a*c >= 0, b*b - 4*a*c, np.nan))
+			t1 = np.where(quadratic, (-b + disc_root) / (2*a), -c / b)
+			t2 = np.where(quadratic, (-b - disc_root) / (2*a), np.nan)
+
+		t = np.concatenate([t1, t2])
+		curves = np.concatenate([curves, curves])
+		valid = (t > 0) & (t < 1)
+		t, (p0, p1, p2, p3) = t[valid], curves[valid].T
+		
+		if len(t):
+			mt = 1 - t
+			extrema = mt**3*p0 + 3*mt**2*t*p1 + 3*mt*t**2*p2 + t**3*p3
+			y_min, y_max = min(y_min, extrema.min()), max(y_max, extrema.max())
+
+	return int(np.floor(y_min)), int(np.ceil(y_max))
+
+def _calc_vertical_bounds(font_tables, ot_font=None):
+	'''Font-wide (yMin, yMax) of all glyph outlines from raw {tag: data} of glyf, loca and head or CFF'''
+	if 'glyf' in font_tables and 'loca' in font_tables:
+		long_offsets = struct.unpack_from('>h', font_tables['head'], 50)[0] == 1
+		font_bounds = _glyf_vertical_bounds(font_tables['glyf'], font_tables['loca'], long_offsets)
+
+	elif 'CFF ' in font_tables:
+		font_bounds = _cff_vertical_bounds(font_tables['CFF '], ot_font)
+
+	elif 'CFF2' in font_tables:
+		raise ValueError('CFF2 outlines not supported for bounds recalculation')
+	
+	else:
+		raise ValueError('No glyf or CFF outlines')
+
+	if font_bounds is None:
+		raise ValueError('No glyph outlines')
+
+	return font_bounds
+
+def _bounds_metrics(font_bounds):
+	y_min, y_max = font_bounds
+	return {'yMin':y_min, 'yMax':y_max, 'usWinAscent':max(y_max, 0), 'usWinDescent':max(-y_min, 0)}
+
+# - Strategies ----------------------------------
+def strategy_metrics(font_scans, strategy):
+	'''Reduce the face scans of one or more fonts (see scan_font) to a single consistent 
+	set of vertical metrics following the given strategy.
+	https://glyphsapp.com/learn/vertical-metrics'''
+	units_per_em = set(font_scan['unitsPerEm'] for font_scan in font_scans)
+
+	if len(units_per_em) != 1:
+		raise ValueError('Fonts with different unitsPerEm: {}'.format(', '.join(str(upm) for upm in sorted(units_per_em))))
+
+	upm = units_per_em.pop()
+	win_ascent = max(max(font_scan['yMax'] for font_scan in font_scans), 0)
+	win_descent = max(-min(font_scan['yMin'] for font_scan in font_scans), 0)
+	metrics = {'usWinAscent':win_ascent, 'usWinDescent':win_descent}
+
+	if strategy == 'google':
+		# - Webfont strategy: typo, hhea and win metrics all match the family bounds, no line gaps
+		metrics.update({'sTypoAscender':win_ascent, 'sTypoDescender':-win_descent, 'sTypoLineGap':0, 
+						'ascent':win_ascent, 'descent':-win_descent, 'lineGap':0})
+		return metrics
+
+	# - Typo ascender and descender span exactly one em, keeping their current proportion
+	typo_ascender = max(font_scan['sTypoAscender'] for font_scan in font_scans)
+	typo_descender = min(font_scan['sTypoDescender'] for font_scan in font_scans)
+	
+	if typo_ascender - typo_descender <= 0:
+		typo_ascender, typo_descender = win_ascent, -win_descent
+
+	typo_ascender = int(round(upm * typo_ascender / float(typo_ascender - typo_descender)))
+	typo_descender = typo_ascender - upm
+
+	if strategy == 'adobe':
+		# - Line gap for 120% line spacing, hhea mirrors the typo metrics
+		typo_line_gap = int(round(upm * .2))
+		metrics.update({'sTypoAscender':typo_ascender, 'sTypoDescender':typo_descender, 'sTypoLineGap':typo_line_gap, 
+						'ascent':typo_ascender, 'descent':typo_descender, 'lineGap':typo_line_gap})
+	
+	elif strategy == 'microsoft':
+		# - Typo line gap makes up the win metrics, hhea mirrors the win metrics
+		typo_line_gap = max(win_ascent + win_descent - upm, 0)
+		metrics.update({'sTypoAscender':typo_ascender, 'sTypoDescender':typo_descender, 'sTypoLineGap':typo_line_gap, 
+						'ascent':win_ascent, 'descent':-win_descent, 'lineGap':0})
+
+	return metrics
 
 # - Clases --------------------------------------
-class FRfontMetrics(object):
-	# TODO: Add Adobe and Microsoft strategies as procedures
-	# https://glyphsapp.com/learn/vertical-metrics
+class FRtimings(object):
+	'''Wall clock time spent in each processing phase, in seconds'''
 	
-	def __init__(self, file_path):
+	def __init__(self):
+		self.phases = {}
+
+	@contextmanager
+	def phase(self, name):
+		time_start = time.perf_counter()
+
+		try:
+			yield
+
+		finally:
+			self.phases[name] = round(self.phases.get(name, 0.) + time.perf_counter() - time_start, 4)
+
+class FRfontWriter(object):
+	'''Writes compiled fonts on a background thread, each one to a temporary file that
+	replaces the output only once complete. Compiling the next font overlaps with the write.'''
+
+	def __init__(self, max_pending=2):
+		self.max_pending = max_pending
+		self.pending = deque()
+		self.executor = ThreadPoolExecutor(max_workers=1)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def _write(self, font_data, output_path):
+		time_start = time.perf_counter()
+		_write_atomic(font_data, output_path)
+		return time.perf_counter() - time_start
+
+	def submit(self, font_data, output_path):
+		'''Queue font_data to be written to output_path, returns a future of the write time.
+		Blocks while max_pending fonts are queued, so only a few compiled fonts are held in memory.'''
+		while len(self.pending) >= self.max_pending:
+			wait([self.pending.popleft()])
+
+		write_future = self.executor.submit(self._write, font_data, output_path)
+		self.pending.append(write_future)
+		return write_future
+
+	def close(self):
+		self.executor.shutdown(wait=True)
+
+class FRfontMetrics(object):
+	def __init__(self, file_path, lazy=False, font_number=None, font=None):
+		from fontTools import ttLib
+
 		self.file_path = file_path
-		self.font = ttLib.TTFont(self.file_path)
+		self.lazy = lazy
+		self.collection = None
+		self.face_tables = set()
+
+		# - Lazy mode: decompile only the tables in lookup_dict. BBox recalculation
+		# - is disabled as it would pull in (and recompile) the whole glyf/CFF data
+		font_options = {'lazy':True, 'recalcBBoxes':False} if self.lazy else {}
+
+		# - Collections: all faces, or only the given font number, are edited. 
+		# - Tables shared between faces are parsed once and stay shared on save.
+		# - An already open font (collection) of file_path can be given instead
+		if font is not None and isinstance(font, ttLib.TTFont):
+			self.font_numbers = [0]
+			self.fonts = [font]
+		elif font is not None or _is_collection(self.file_path):
+			self.collection = font if font is not None else ttLib.TTCollection(self.file_path, shareTables=True, **font_options)
+			self.font_numbers = list(range(len(self.collection.fonts))) if font_number is None else [font_number]
+			self.fonts = [self.collection.fonts[number] for number in self.font_numbers]
+		else:
+			self.font_numbers = [0]
+			self.fonts = [ttLib.TTFont(self.file_path, **font_options)]
+
+		self.font = self.fonts[0]
 	
 	# - Internals
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
 	def __getitem__(self, item):
 		if item in lookup_dict.keys():
 			return getattr(self.font[lookup_dict[item]], item)
 		
 	def __setitem__(self, item, value):
 		if item in lookup_dict.keys():
-			return setattr(self.font[lookup_dict[item]], item, value)
+			# - A table shared between collection faces is copied for each face that edits it,
+			# - so faces given different values keep their own. Equal tables are shared again on save
+			tag = lookup_dict[item]
+			table = self.font[tag]
+
+			if self.collection is not None and (id(self.font), tag) not in self.face_tables:
+				table = copy.deepcopy(table)
+				self.face_tables.add((id(self.font), tag))
+
+			setattr(table, item, value)
+			self.font[tag] = table
 
 	# - Procedures 
+	def faces(self):
+		'''Make each selected face of the font (collection) the current font in turn'''
+		for number, font in zip(self.font_numbers, self.fonts):
+			self.font = font
+			yield number
+
+		self.font = self.fonts[0]
+
+	def close(self):
+		'''Release the font data and the source file handles'''
+		if self.collection is not None:
+			self.collection.close()
+		else:
+			self.font.close()
+
+		self.fonts, self.font, self.collection = [], None, None
+
 	def save(self, output_path=None):
+		self.write(self.compile(), output_path)
+
+	def compile(self):
+		'''Binary data of the whole font (collection), compiled in memory'''
+		if self.collection is not None:
+			return self._compile_collection()
+		elif self.lazy:
+			return self._compile_lazy()
+		
+		font_data = BytesIO()
+		self.font.save(font_data)
+		return font_data.getvalue()
+
+	def write(self, font_data, output_path=None):
+		'''Write compiled font data through a temporary file. Everything is read at this point, so it is safe to replace the source file'''
 		output_path = self.file_path if output_path is None else output_path
-		self.font.save(output_path)
+		_write_atomic(font_data, output_path)
+
+	def _compile_collection(self):
+		'''Compile all faces with shared tables, untouched tables of lazy faces are passed through as raw bytes'''
+		font_data = BytesIO()
+		self.collection.save(font_data, shareTables=True)
+		return font_data.getvalue()
+
+	def _compile_lazy(self):
+		'''Compile only the edited metrics tables, pass all other tables through as raw bytes'''
+		from fontTools.ttLib.sfnt import SFNTWriter
+
+		edit_tables = set(lookup_dict.values())
+		font_tags = list(self.font.reader.keys())
+		font_data = BytesIO()
+		
+		writer = SFNTWriter(font_data, len(font_tags), self.font.sfntVersion, self.font.flavor, self.font.flavorData)
+
+		for tag in font_tags:
+			if tag in edit_tables and self.font.isLoaded(tag):
+				writer[tag] = self.font.getTableData(tag)
+			else:
+				writer[tag] = self.font.reader[tag]
+
+		writer.close()
+		return font_data.getvalue()
+
+	def calcBounds(self):
+		'''Vertical extents (yMin, yMax) of all glyph outlines'''
+		font_tables = {tag:self.font.getTableData(tag) for tag in ('head', 'glyf', 'loca', 'CFF ', 'CFF2') if tag in self.font}
+		return _calc_vertical_bounds(font_tables, self.font)
+
+	def recalcBounds(self):
+		'''Set head yMin/yMax and OS/2 win metrics to the vertical extents of all glyph outlines'''
+		bounds_metrics = _bounds_metrics(self.calcBounds())
+		self.fromDict(bounds_metrics)
+		return bounds_metrics
 	
 	def dump(self):
 		return [(item, self[item]) for item in lookup_dict.keys()]
@@ -74,13 +709,368 @@ class FRfontMetrics(object):
 		for item, value in metrics_dict.items():
 			self[item] = value
 
+class FRsfntMetrics(object):
+	'''Binary sfnt metrics object: reads and patches the lookup_dict fields 
+	directly in the font (collection) file, without going through fontTools.'''
+
+	def __init__(self, file_path, font_number=None, exclusive=False, uniform=True):
+		'''Exclusive: the selected faces are to be patched, so none of their metrics tables 
+		may be shared with a face not selected - else ValueError, as patching would change both.
+		Not uniform: the faces get values of their own (recalculated bounds), so with exclusive
+		no metrics table may be shared between the selected faces either.'''
+		self.file_path = file_path
+		self.face_offsets, self.face_tables, self.face_changes = [], [], []
+
+		with open(self.file_path, 'rb') as font_file, mmap.mmap(font_file.fileno(), 0, access=mmap.ACCESS_READ) as font_data:
+			face_offsets = _read_face_offsets(font_data)
+			self.font_numbers = list(range(len(face_offsets))) if font_number is None or len(face_offsets) == 1 else [font_number]
+			
+			for number in self.font_numbers:
+				face_offset = face_offsets[number]
+
+				if font_data[face_offset:face_offset + 4] not in sfnt_versions:
+					raise ValueError('Unsupported font format: {}'.format(self.file_path))
+
+				directory = _read_sfnt_directory(font_data, face_offset)
+				self.face_offsets.append(face_offset)
+				self.face_tables.append({tag:font_data[offset:offset + length] for tag, (record, checksum, offset, length) in directory.items() if tag in lookup_dict.values()})
+				self.face_changes.append({})
+
+			# - Collections: fontTools un-shares tables edited on some faces only, patching in place can not
+			if exclusive and len(self.font_numbers) < len(face_offsets):
+				table_offsets = lambda directory: set(offset for tag, (record, checksum, offset, length) in directory.items() if tag in lookup_dict.values())
+				selected_offsets = set().union(*[table_offsets(_read_sfnt_directory(font_data, face_offsets[number])) for number in self.font_numbers])
+				other_offsets = set().union(*[table_offsets(_read_sfnt_directory(font_data, face_offset)) for number, face_offset in enumerate(face_offsets) if number not in self.font_numbers])
+
+				if len(selected_offsets & other_offsets):
+					raise ValueError('Metrics tables shared with faces not selected: {}'.format(self.file_path))
+
+			if exclusive and not uniform and len(self.font_numbers) > 1:
+				face_table_offsets = [[offset for tag, (record, checksum, offset, length) in _read_sfnt_directory(font_data, face_offsets[number]).items() if tag in lookup_dict.values()] for number in self.font_numbers]
+
+				if len(set().union(*face_table_offsets)) < sum(len(table_offsets) for table_offsets in face_table_offsets):
+					raise ValueError('Metrics tables shared between faces with metrics of their own: {}'.format(self.file_path))
+
+		self.face_offset, self.tables, self.changes = self.face_offsets[0], self.face_tables[0], self.face_changes[0]
+
+	# - Internals
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def __getitem__(self, item):
+		if item in self.changes:
+			return self.changes[item]
+
+		if item in lookup_dict.keys():
+			table = self.tables.get(lookup_dict[item], b'')
+			field_offset, field_format = lookup_struct[item]
+
+			if field_offset + struct.calcsize(field_format) <= len(table):
+				return struct.unpack_from(field_format, table, field_offset)[0]
+		
+	def __setitem__(self, item, value):
+		if item in lookup_dict.keys():
+			self.changes[item] = int(value)
+
+	# - Procedures 
+	def faces(self):
+		'''Make each selected face of the font (collection) the current font in turn'''
+		for number, face_offset, tables, changes in zip(self.font_numbers, self.face_offsets, self.face_tables, self.face_changes):
+			self.face_offset, self.tables, self.changes = face_offset, tables, changes
+			yield number
+
+		self.face_offset, self.tables, self.changes = self.face_offsets[0], self.face_tables[0], self.face_changes[0]
+
+	def close(self):
+		'''Nothing to release: files are only opened while reading and patching'''
+		pass
+
+	def save(self, output_path=None):
+		'''Patch a copy of the source file, which then replaces the output (or the source) file'''
+		output_path = self.file_path if output_path is None else output_path
+
+		with _atomic_output(output_path) as temp_path:
+			shutil.copyfile(self.file_path, temp_path)
+
+			with open(temp_path, 'r+b') as font_file:
+				with mmap.mmap(font_file.fileno(), 0) as font_data:
+					self._patch(font_data)
+					font_data.flush()
+
+				os.fsync(font_file.fileno())
+
+	def _patch(self, font_data):
+		face_offsets = _read_face_offsets(font_data)
+		directories = [_read_sfnt_directory(font_data, face_offset) for face_offset in face_offsets]
+		changed_offsets = set()
+		changed_fields = {}
+
+		# - Fields
+		for number, changes in zip(self.font_numbers, self.face_changes):
+			directory = directories[number]
+
+			for item, value in changes.items():
+				tag = lookup_dict[item]
+				field_offset, field_format = lookup_struct[item]
+
+				if tag not in directory or field_offset + struct.calcsize(field_format) > directory[tag][3]:
+					raise ValueError('Missing {} {} field: {}'.format(tag, item, self.file_path))
+
+				# - A shared table can hold only one value, see uniform
+				if changed_fields.setdefault(directory[tag][2] + field_offset, value) != value:
+					raise ValueError('Different {} {} values for faces sharing the table: {}'.format(tag, item, self.file_path))
+
+				struct.pack_into(field_format, font_data, directory[tag][2] + field_offset, value)
+				changed_offsets.add(directory[tag][2])
+
+		# - Checksums of every face using a changed table, as collections may share tables between faces
+		for face_offset, directory in zip(face_offsets, directories):
+			changed_tables = [tag for tag, (record, checksum, offset, length) in directory.items() if offset in changed_offsets]
+
+			# - Table checksums, head is summed with checkSumAdjustment set to zero
+			for tag in changed_tables:
+				record, checksum, offset, length = directory[tag]
+				table = font_data[offset:offset + length]
+				
+				if tag == 'head':
+					table = table[:8] + b'\0\0\0\0' + table[12:]
+
+				struct.pack_into('>L', font_data, record + 4, _calc_checksum(table))
+
+			# - Font checksum, same as the fontTools SFNTWriter: directory plus table checksums
+			if len(changed_tables) and 'head' in directory:
+				directory_end = face_offset + 12 + 16 * len(directory)
+				checksum = _calc_checksum(font_data[face_offset:directory_end])
+				checksum += sum(struct.unpack_from('>L', font_data, record + 4)[0] for record, _, _, _ in directory.values())
+				struct.pack_into('>L', font_data, directory['head'][2] + 8, (0xB1B0AFBA - checksum) & 0xffffffff)
+
+	def calcBounds(self):
+		'''Vertical extents (yMin, yMax) of all glyph outlines'''
+		with open(self.file_path, 'rb') as font_file, mmap.mmap(font_file.fileno(), 0, access=mmap.ACCESS_READ) as font_data:
+			directory = _read_sfnt_directory(font_data, self.face_offset)
+			font_tables = {tag:font_data[offset:offset + length] for tag, (record, checksum, offset, length) in directory.items() if tag in ('head', 'glyf', 'loca', 'CFF ', 'CFF2')}
+
+		return _calc_vertical_bounds(font_tables)
+
+	def recalcBounds(self):
+		'''Set head yMin/yMax and OS/2 win metrics to the vertical extents of all glyph outlines'''
+		bounds_metrics = _bounds_metrics(self.calcBounds())
+		self.fromDict(bounds_metrics)
+		return bounds_metrics
+	
+	def dump(self):
+		return [(item, self[item]) for item in lookup_dict.keys()]
+
+	def fromDict(self, metrics_dict:dict):
+		for item, value in metrics_dict.items():
+			self[item] = value
+
+# - Batch ---------------------------------------
+def scan_font(work_file, font_number=None):
+	'''Read the extents and metrics needed by strategy_metrics from all selected faces of a font file'''
+	try:
+		font_metrics = FRsfntMetrics(work_file, font_number)
+
+	except ValueError:
+		font_metrics = FRfontMetrics(work_file, lazy=True, font_number=font_number)
+
+	font_scans = []
+
+	with font_metrics:
+		for number in font_metrics.faces():
+			y_min, y_max = font_metrics.calcBounds()
+			font_scans.append({	'yMin':y_min, 'yMax':y_max, 'unitsPerEm':font_metrics['unitsPerEm'], 
+								'sTypoAscender':font_metrics['sTypoAscender'], 'sTypoDescender':font_metrics['sTypoDescender']})
+
+	return font_scans
+
+def process_font(work_file, work_path, args, input_metrics=None, cache_entry=None):
+	'''Load, modify and save a single font file. Runs in a worker process with --jobs,
+	so all messages are collected into the returned result instead of printed.
+	A font matching its cache_entry from a previous run is skipped entirely.
+	The font is released before returning, the result records its time and peak RSS.
+	A plan only records the old and new value of every metric to be changed, nothing is saved.
+	With --timings the result records the time spent in each phase: import, parse, decompile, edit, compile and write.'''
+	time_start = time.perf_counter()
+	timings = FRtimings()
+	_reset_peak_rss()
+
+	font_filename = os.path.split(work_file)[1]
+	font_save_path = os.path.join(work_path, font_filename)
+	result = {'file':work_file, 'output':None, 'status':'unchanged', 'changes':{}, 'time':None, 'timings':None, 'peak_rss':None, 'messages':[], 'report':None, 'row':None, 'plan':None, 'cache':None}
+	read_only = args.report_metrics or args.dump_metrics or args.stream_metrics is not None
+	param_metrics = {param:getattr(args, param) for param in lookup_dict.keys() if getattr(args, param) is not None}
+	font_metrics = None
+	output_hash = None
+
+	try:
+		# - Result cache: same input (or our own output, if saved in place), same parameters and untouched output
+		if not read_only and not args.plan:
+			font_params = {	'metrics':input_metrics if input_metrics is not None else param_metrics,
+							'recalc_bounds':args.recalc_bounds,
+							'font_number':args.font_number
+						}
+			input_hash = _file_hash(work_file)
+
+			if cache_entry is not None and cache_entry['params'] == font_params and cache_entry['output'] == os.path.abspath(font_save_path):
+				if input_hash in (cache_entry['input_hash'], cache_entry['output_hash']) and os.path.exists(font_save_path):
+					if _file_hash(font_save_path) == cache_entry['output_hash']:
+						result['messages'].append((2, 'Font: {} Unchanged since last run; Skipped'.format(work_file)))
+						result['output'] = font_save_path
+						result['status'] = 'cached'
+						return result
+
+		# - Reading and patching plain sfnt files (and collections) does not need fontTools
+		if args.patch or args.plan or read_only:
+			try:
+				with timings.phase('parse'):
+					font_metrics = FRsfntMetrics(work_file, args.font_number, exclusive=not (read_only or args.plan), uniform=not args.recalc_bounds)
+			
+			except ValueError as the_error:
+				result['messages'].append((1, '{}; Falling back to fontTools'.format(the_error)))
+
+		if font_metrics is None:
+			with timings.phase('import'):
+				from fontTools import ttLib
+
+			with timings.phase('parse'):
+				font_metrics = FRfontMetrics(work_file, lazy=args.lazy, font_number=args.font_number)
+
+		# - Faces of collections are labeled with their font number
+		is_collection = _is_collection(work_file)
+		face_label = lambda label, number: '{}#{}'.format(label, number) if is_collection else label
+		
+		# - Process
+		if read_only:
+			with timings.phase('decompile'):
+				font_metrics_dumps = [(number, font_metrics.dump()) for number in font_metrics.faces()]
+
+		if args.report_metrics:
+			result['report'] = '\n'.join(['{deco}\nFont:\t{font}\n{deco}\n{metric}\n'.format(deco='-'*40, font=face_label(font_filename, number), metric='\n'.join(['{}\t{} : {}'.format(lookup_dict[item[0]],item[0],item[1]) for item in font_metrics_dump])) for number, font_metrics_dump in font_metrics_dumps])
+			result['status'] = 'reported'
+			return result
+		
+		elif args.dump_metrics:
+			for number, font_metrics_dump in font_metrics_dumps:
+				font_metrics_dump_filename = os.path.join(work_path, face_label(os.path.splitext(font_filename)[0], number).replace('#', '-') + '-metrics-dump.json')
+				with open(font_metrics_dump_filename, 'w') as json_tree:
+					json_tree.write(json.dumps(font_metrics_dump))
+				
+				result['messages'].append((0, 'Saved font metrics dump: {}'.format(font_metrics_dump_filename)))
+
+			result['output'] = font_metrics_dump_filename
+			result['status'] = 'dumped'
+			return result
+
+		elif args.stream_metrics is not None:
+			result['row'] = [dict([('file', face_label(work_file, number))] + font_metrics_dump) for number, font_metrics_dump in font_metrics_dumps]
+			result['status'] = 'streamed'
+			return result
+
+		elif args.plan:
+			result['plan'] = []
+
+			for number in font_metrics.faces():
+				with timings.phase('decompile'):
+					font_metrics_current = dict(font_metrics.dump())
+
+				with timings.phase('edit'):
+					face_changes = _bounds_metrics(font_metrics.calcBounds()) if args.recalc_bounds else {}
+				
+				face_changes.update(input_metrics if input_metrics is not None else param_metrics)
+				result['plan'].append({'file':face_label(work_file, number), 'changes':{item:[font_metrics_current[item], value] for item, value in face_changes.items() if item in lookup_dict and font_metrics_current[item] != value}})
+
+			result['status'] = 'planned'
+			return result
+
+		if input_metrics is None:
+			for param, new_parameter_value in param_metrics.items():
+				result['messages'].append((0, 'Font: {} Changed: {} to {}'.format(font_save_path, param, new_parameter_value)))
+
+		changes_needed = False
+
+		for number in font_metrics.faces():
+			with timings.phase('decompile'):
+				font_metrics_current = dict(font_metrics.dump())
+			
+			face_changes = {}
+
+			with timings.phase('edit'):
+				if args.recalc_bounds:
+					bounds_metrics = font_metrics.recalcBounds()
+					face_changes.update(bounds_metrics)
+					result['messages'].append((0, 'Font: {} Recalculated bounds: {}'.format(face_label(font_save_path, number), ', '.join('{} to {}'.format(*item) for item in bounds_metrics.items()))))
+				
+				if input_metrics is not None: 
+					font_metrics.fromDict(input_metrics)
+					face_changes.update(input_metrics)
+					
+				else:
+					font_metrics.fromDict(param_metrics)
+					face_changes.update(param_metrics)
+
+			changes_needed = changes_needed or any(font_metrics_current.get(item) != value for item, value in face_changes.items() if item in lookup_dict)
+			result['changes'].update(face_changes)
+
+		# - Save changes, unless the font already has all requested metrics
+		if len(result['changes']):
+			if not changes_needed:
+				if os.path.abspath(font_save_path) != os.path.abspath(work_file):
+					with _atomic_output(font_save_path) as temp_path:
+						shutil.copyfile(work_file, temp_path)
+
+				result['messages'].append((2, 'Font: {} Metrics already up to date; Not saved'.format(work_file)))
+			
+			elif isinstance(font_metrics, FRsfntMetrics):
+				# - Patches are written straight into the output file, there is nothing to compile
+				with timings.phase('write'):
+					font_metrics.save(font_save_path)
+			
+			else:
+				with timings.phase('compile'):
+					font_data = font_metrics.compile()
+
+				# - Without worker processes the write runs in the background, see _committed
+				with timings.phase('write'):
+					if output_writer is not None:
+						result['write'] = output_writer.submit(font_data, font_save_path)
+					else:
+						font_metrics.write(font_data, font_save_path)
+
+				output_hash = hashlib.sha1(font_data).hexdigest()
+
+			if changes_needed:
+				result['messages'].append((0, 'Saved Font: {}'.format(font_save_path)))
+				result['status'] = 'saved'
+
+			result['output'] = font_save_path
+			result['cache'] = {'input_hash':input_hash, 'params':font_params, 'output':os.path.abspath(font_save_path), 'output_hash':output_hash or _file_hash(font_save_path)}
+	
+	except Exception as the_error:
+		result['messages'].append((-1, 'Font: {}; {}'.format(work_file, the_error)))
+		result['status'] = 'error'
+
+	finally:
+		# - Release the font deterministically, also on early returns
+		if font_metrics is not None:
+			font_metrics.close()
+
+		result['time'] = round(time.perf_counter() - time_start, 4)
+		result['timings'] = timings.phases if args.timings else None
+		result['peak_rss'] = _peak_rss()
+
+	return result
+
 # -- Setup CLI
 arg_parser = argparse.ArgumentParser(prog=tool_name, description=tool_description)
 
 arg_parser.add_argument('File',
 						type=str,
 						metavar='font file(s)',
-						help='A *.ttf or *.otf font file(s)')
+						help='A *.ttf, *.otf, *.ttc or *.otc font file(s)')
 						
 
 arg_parser.add_argument('--output-path', '-o',
@@ -105,6 +1095,104 @@ arg_parser.add_argument('--dump-metrics', '-d',
 						required=False,
 						help='Dump file metrics in *.JSON format')
 
+arg_parser.add_argument('--stream-metrics', '-s',
+						type=str,
+						choices=stream_formats,
+						required=False,
+						help='Stream file metrics of all fonts as one row per font')
+
+arg_parser.add_argument('--stream-output',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write the metrics stream to a file instead of stdout')
+
+arg_parser.add_argument('--plan',
+						action='store_true',
+						required=False,
+						help='Dry run: write the old and new values of all metrics to be changed as *.JSON, save nothing')
+
+arg_parser.add_argument('--plan-output',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write the plan to a file instead of stdout')
+
+arg_parser.add_argument('--lazy', '-l',
+						action='store_true',
+						required=False,
+						help='Lazy mode: decompile only OS/2, hhea and head tables; copy all other tables as raw bytes')
+
+arg_parser.add_argument('--patch', '-p',
+						action='store_true',
+						required=False,
+						help='Patch mode: write the metrics directly into the binary font file, bypassing fontTools')
+
+arg_parser.add_argument('--font-number', '-y',
+						type=int,
+						metavar='N',
+						required=False,
+						help='Process only font number N of a *.ttc or *.otc collection (default: all)')
+
+arg_parser.add_argument('--recalc-bounds', '-b',
+						action='store_true',
+						required=False,
+						help='Set HEAD yMin/yMax and OS/2 usWinAscent/usWinDescent from the coordinates of all glyph outlines, not the stored glyph bounds; glyf and CFF only (requires NumPy)')
+
+arg_parser.add_argument('--strategy', '-t',
+						type=str,
+						choices=metric_strategies,
+						required=False,
+						help='Set typo, hhea and win metrics following a vertical metrics strategy (requires NumPy)')
+
+arg_parser.add_argument('--family', '-f',
+						action='store_true',
+						required=False,
+						help='Apply one strategy metrics set computed over all font files')
+
+arg_parser.add_argument('--cache-file',
+						type=str,
+						default=cache_path,
+						metavar='path',
+						required=False,
+						help='Font scan and result cache file')
+
+arg_parser.add_argument('--force',
+						action='store_true',
+						required=False,
+						help='Process all fonts, ignoring cached results of previous runs')
+
+arg_parser.add_argument('--jobs', '-j',
+						type=int,
+						default=1,
+						metavar='N',
+						required=False,
+						help='Process fonts on a pool of N worker processes (0 = all CPUs)')
+
+arg_parser.add_argument('--max-in-flight',
+						type=int,
+						default=0,
+						metavar='N',
+						required=False,
+						help='Keep at most N fonts queued or in progress on the worker pool (default: 2 per worker)')
+
+arg_parser.add_argument('--timings',
+						action='store_true',
+						required=False,
+						help='Report the time spent on import, parse, decompile, edit, compile and write of every font')
+
+arg_parser.add_argument('--profile',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write cProfile statistics of the run (on a single process) to path')
+
+arg_parser.add_argument('--summary',
+						type=str,
+						metavar='path',
+						required=False,
+						help='Write a batch summary in *.JSON format')
+
 for param, loc in lookup_dict.items():
 	arg_parser.add_argument('--{}'.format(param),
 							type=int,
@@ -117,74 +1205,195 @@ arg_parser.add_argument('--version', '-v',
 						version='{} | {} | VER. {}'.format(tool_name, tool_description, __version__),
 						help='Show tool version.')
 
-args = arg_parser.parse_args()
+if __name__ == '__main__':
+	args = arg_parser.parse_args()
 
-# -- Paths and configuration
-font_files = glob.glob(args.File)
-work_path = args.output_path if args.output_path is not None else os.path.split(font_files[0])[0]
+	if args.family and args.strategy is None:
+		arg_parser.error('--family requires --strategy')
 
-# - Begin ----------------------------------------------------------
-_output(2, 'FontRig | {} ver. {}'.format(tool_name, __version__))
+	# -- Paths and configuration
+	font_files = glob.glob(args.File)
+	work_path = args.output_path if args.output_path is not None else os.path.split(font_files[0])[0]
+	worker_count = args.jobs if args.jobs > 0 else os.cpu_count() 
+	worker_count = 1 if args.profile is not None else worker_count # - Worker processes are not profiled
+	read_only = args.report_metrics or args.dump_metrics or args.stream_metrics is not None
+	stream_file = None
 
-if not os.path.exists(work_path): 
-	try:
-		os.makedirs(work_path)
-		_output(0, 'Creating folder: {}'.format(work_path))
-	
-	except OSError:
-		the_error = 'Creating folder: {}; Aborting'.format(work_path)
-		_output(-1, the_error)
-		sys.exit(1)
+	if args.stream_metrics is not None:
+		if args.stream_output is not None:
+			stream_file = open(args.stream_output, 'w', newline='')
+		else:
+			stream_file = sys.stdout
+			output_stream = sys.stderr
 
-# -- Process
-for work_file in font_files:
-	font_metrics = FRfontMetrics(work_file)
-	font_filename = os.path.split(work_file)[1]
-	font_save_path = os.path.join(work_path, font_filename)
-	
-	font_metrics_dump = font_metrics.dump()
-	changes_made = False
-	
-	# - Process
-	if args.report_metrics:
-		report_string = '{deco}\nFont:\t{font}\n{deco}\n{metric}\n'.format(deco='-'*40, font=font_filename, metric='\n'.join(['{}\t{} : {}'.format(lookup_dict[item[0]],item[0],item[1]) for item in font_metrics_dump]))
-		print(report_string)
-		continue
-	
-	elif args.dump_metrics:
-		font_metrics_dump_filename = os.path.join(work_path, os.path.splitext(font_filename)[0] + '-metrics-dump.json')
-		with open(font_metrics_dump_filename, 'w') as json_tree:
-			json_tree.write(json.dumps(font_metrics_dump))
+		if args.stream_metrics == 'csv':
+			stream_writer = csv.DictWriter(stream_file, fieldnames=['file'] + list(lookup_dict.keys()))
+			stream_writer.writeheader()
+			stream_row = stream_writer.writerow
+		else:
+			stream_row = lambda row: stream_file.write(json.dumps(row) + '\n')
+
+	if args.plan and args.plan_output is None:
+		output_stream = sys.stderr
+
+	# - Begin ----------------------------------------------------------
+	_output(2, 'FontRig | {} ver. {}'.format(tool_name, __version__))
+
+	if not args.plan and not os.path.exists(work_path): 
+		try:
+			os.makedirs(work_path)
+			_output(0, 'Creating folder: {}'.format(work_path))
 		
-		_output(0,'Saved font metrics dump: {}'.format(font_metrics_dump_filename))
-		continue
-	
-	elif args.input_metrics is not None: 
-		input_metrics = None
+		except OSError:
+			the_error = 'Creating folder: {}; Aborting'.format(work_path)
+			_output(-1, the_error)
+			sys.exit(1)
+
+	input_metrics = None
 
+	if args.input_metrics is not None and not read_only:
 		with open(args.input_metrics, 'r') as json_tree:
-			input_metrics = json.load(json_tree)
+			input_metrics = dict(json.load(json_tree))
 
 		_output(0,'Loaded font metrics: {}'.format(args.input_metrics))
-		font_metrics.fromDict(dict(input_metrics))
-		changes_made = True
-		
-	else:
-		for param, loc in lookup_dict.items():
-			new_parameter_value = getattr(args, param)
+
+	if args.profile is not None:
+		profiler = cProfile.Profile()
+		profiler.enable()
+
+	# -- Worker pool: a bounded number of fonts in flight keeps memory flat on large batches
+	in_flight = args.max_in_flight if args.max_in_flight > 0 else 2 * worker_count
+	executor = ProcessPoolExecutor(max_workers=worker_count) if worker_count > 1 else None
+	process_map = (lambda function, *iterables: _bounded_map(executor, function, in_flight, *iterables)) if executor is not None else map
+	
+	# -- Without worker processes, fonts are written on a background thread while the next one is processed
+	if executor is None and not read_only and not args.plan:
+		output_writer = FRfontWriter()
+
+	time_start = time.perf_counter()
+	font_input_metrics = repeat(input_metrics)
+	font_cache_entries = repeat(None)
+	font_keys = [os.path.abspath(work_file) for work_file in font_files]
+
+	if not read_only:
+		metrics_cache = _load_cache(args.cache_file)
+		result_cache = metrics_cache.setdefault('results', {})
+
+		if not args.force:
+			font_cache_entries = [result_cache.get(_result_key(work_file, os.path.join(work_path, os.path.split(work_file)[1]))) for work_file in font_files]
+
+	# -- Strategy: scan fonts in parallel, only files changed since the last scan are read
+	if args.strategy is not None and not read_only:
+		scan_cache = metrics_cache.setdefault('scan', {})
+		font_stamps = [_file_stamp(work_file) + [args.font_number] for work_file in font_files]
+		scan_fonts = [(work_file, key, stamp) for work_file, key, stamp in zip(font_files, font_keys, font_stamps) if scan_cache.get(key, {}).get('stamp') != stamp]
+
+		try:
+			for (work_file, key, stamp), font_scans in zip(scan_fonts, process_map(scan_font, [item[0] for item in scan_fonts], repeat(args.font_number))):
+				scan_cache[key] = {'stamp':stamp, 'scan':font_scans}
+
+			font_scans = [scan_cache[key]['scan'] for key in font_keys]
+
+			if args.family:
+				family_metrics = strategy_metrics([face_scan for face_scans in font_scans for face_scan in face_scans], args.strategy)
+				font_input_metrics = repeat(dict(family_metrics, **(input_metrics or {})))
+				_output(0, 'Family metrics ({}): {}'.format(args.strategy, ', '.join('{} {}'.format(*item) for item in family_metrics.items())))
 			
-			if new_parameter_value is not None:
-				font_metrics[param] = new_parameter_value
-				changes_made = True
-				_output(0,'Font: {} Changed: {} to {}'.format(font_save_path, param, new_parameter_value))
+			else:
+				font_input_metrics = [dict(strategy_metrics(face_scans, args.strategy), **(input_metrics or {})) for face_scans in font_scans]
+		
+		except Exception as the_error:
+			_output(-1, 'Strategy {}: {}; Aborting'.format(args.strategy, the_error))
+			sys.exit(1)
 
-	# - Save changes
-	if changes_made:
-		font_metrics.save(font_save_path)
-		_output(0,'Saved Font: {}'.format(font_save_path))
+		_output(2, 'Scanned: {} fonts; Cached: {}'.format(len(scan_fonts), len(font_files) - len(scan_fonts)))
 
+	# -- Process: results are streamed back in input order
+	# -- Only running totals are kept, per font entries only for the --summary file
+	batch_results = []
+	batch_status = {}
+	batch_timings = {phase:0. for phase in timing_phases}
+	batch_peak_rss = None
+	batch_plan = []
 
+	for result in _committed(process_map(process_font, font_files, repeat(work_path), repeat(args), font_input_metrics, font_cache_entries), 2):
+		if result['report'] is not None:
+			print(result['report'])
 
+		if result['row'] is not None:
+			for row in result['row']:
+				stream_row(row)
 
-	
+		for i, message in result['messages']:
+			_output(i, message)
+
+		if result['timings'] is not None:
+			_output(2, 'Font: {} Timings: {}'.format(result['file'], ', '.join('{} {:.4f} s'.format(*item) for item in result['timings'].items())))
+
+		if result['plan'] is not None:
+			batch_plan += result['plan']
+
+		if result['cache'] is not None:
+			result_cache[_result_key(result['file'], result['cache']['output'])] = result['cache']
+
+		batch_status[result['status']] = batch_status.get(result['status'], 0) + 1
+
+		if result['peak_rss'] is not None:
+			batch_peak_rss = max(batch_peak_rss or 0., result['peak_rss'])
+
+		if result['timings'] is not None:
+			for phase, phase_time in result['timings'].items():
+				batch_timings[phase] = batch_timings.get(phase, 0.) + phase_time
+
+		if args.summary is not None:
+			batch_results.append({key:value for key, value in result.items() if key not in ('messages', 'report', 'row', 'plan', 'cache')})
+
+	if executor is not None:
+		executor.shutdown()
+
+	if output_writer is not None:
+		output_writer.close()
+
+	if args.profile is not None:
+		profiler.disable()
+		profiler.dump_stats(args.profile)
+		_output(0, 'Saved profile: {}'.format(args.profile))
+
+	# - A plan is a dry run, it does not touch the cache either
+	if not read_only and not args.plan:
+		_save_cache(args.cache_file, metrics_cache)
+
+	if stream_file is not None and stream_file is not sys.stdout:
+		stream_file.close()
+		_output(0, 'Saved font metrics stream: {}'.format(args.stream_output))
+
+	if args.plan:
+		plan_file = open(args.plan_output, 'w') if args.plan_output is not None else sys.stdout
+		plan_file.write(json.dumps({'tool':tool_name, 'version':__version__, 'fonts':batch_plan}, indent=4) + '\n')
+
+		if plan_file is not sys.stdout:
+			plan_file.close()
+			_output(0, 'Saved metrics plan: {}'.format(args.plan_output))
+
+	# -- Summary
+	batch_summary = {	'tool':tool_name,
+						'version':__version__,
+						'jobs':worker_count,
+						'total':sum(batch_status.values()),
+						'saved':batch_status.get('saved', 0),
+						'planned':batch_status.get('planned', 0),
+						'cached':batch_status.get('cached', 0),
+						'failed':batch_status.get('error', 0),
+						'time':round(time.perf_counter() - time_start, 4),
+						'peak_rss':batch_peak_rss,
+						'timings':{phase:round(phase_time, 4) for phase, phase_time in batch_timings.items()} if args.timings else None,
+						'fonts':batch_results
+					}
+
+	_output(2, 'Processed: {total} fonts; Saved: {saved}; Cached: {cached}; Failed: {failed}; Time: {time:.2f} s; Peak RSS per font: {peak_rss} MB'.format(**batch_summary))
+
+	if args.summary is not None:
+		with open(args.summary, 'w') as json_tree:
+			json_tree.write(json.dumps(batch_summary, indent=4))
 
+		_output(0, 'Saved batch summary: {}'.format(args.summary))
@@ -10,19 +10,28 @@
 
 from __future__ import absolute_import, print_function, unicode_literals
 
-__version__ = 1.00
+__version__ = 1.05
 
 # - Dependencies --------------------------------------------
 import argparse
+import atexit
 import datetime
+import hashlib
 import json
 import os
+import pickle
+import re
+import shutil
 import sys
+import tempfile
 import time
 import ufoLib2
 
 from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from fontTools import designspaceLib
+from fontTools.ufoLib import UFOReader
 
 # -- String -------------------------------------------------
 tool_name = 'FR-UFO-REPL'
@@ -41,6 +50,9 @@ fea_head='''# File:			OpenType Layout feature definitions
 # Font name: 	{fontname}
 '''
 
+fea_hash_comment = '# Glyph set: '
+fea_block_size = 4096
+
 fea_lang = '''# Languagesystem definitions
 languagesystem DFLT dflt; # Default default
 languagesystem latn dflt; # Latin default
@@ -66,11 +78,26 @@ replace_dict = {'0':'digit_zero',
 				}
 
 # ---- List of reserved words that we will escape with backslash
+special_words = []
+
+# ---- Glyphs (and words in glyph names) that get no substitution
 ignored_words = []
 ignored_glyphs = ['.notdef', 'space', 'uni00A0', 'uni000A', 'period', 'CR']
 
 # -- Path and file ------------------------------------------
 ext_designspace = '.designspace'
+ext_snapshot = '.pickle'
+snapshot_path = os.path.join(os.path.expanduser('~'), '.cache', 'fontrig', 'fr-ufo-repl')
+snapshot_version = '{}-{}'.format(__version__, ufoLib2.__version__)
+
+# ---- Snapshots hook into ufoLib2 internals: the font path, the layer glyph sets, the glyph state 
+# ---- and the groups and kerning readers. Without them sources are opened plainly.
+ufo_fields = lambda ufo_class: set(field.name for field in getattr(ufo_class, '__attrs_attrs__', ()))
+snapshot_support = '_path' in ufo_fields(ufoLib2.objects.Font) and '_glyphSet' in ufo_fields(ufoLib2.objects.Layer) and all(method in vars(ufoLib2.objects.Glyph) for method in ('__getstate__', '__setstate__')) and all(hasattr(UFOReader, method) for method in ('readGroups', 'readKerning'))
+
+# ---- Permissions of new files, temporary files are created private
+file_umask = os.umask(0)
+os.umask(file_umask)
 
 # -- Classes ------------------------------------------------
 class inspect_obj(object):
@@ -104,7 +131,340 @@ class inspect_obj(object):
 			for i in range(len(self_attribs)):
 				print('Test: %s;\tAttrib: %s;\tValues: %s' %(self_attribs[i][1] == other_attribs[i][1], self_attribs[i][0], (self_attribs[i][1], other_attribs[i][1])))
 
+class source_snapshot(object):
+	'''On-disk snapshot of the parsed glyphs, groups and kerning of a UFO source.
+	Every record is keyed by the path, mtime and size of the file it was parsed from,
+	and pickled as soon as it is parsed - later edits in the session never get in.'''
+	def __init__(self, ufo_path, snapshot_folder):
+		self.ufo_path = os.path.abspath(ufo_path)
+		self.file_path = os.path.join(snapshot_folder, hashlib.sha1(self.ufo_path.encode('utf-8')).hexdigest() + ext_snapshot)
+		self.glyphs, self.groups, self.kerning = {}, None, None
+		self.modified = False
+
+		try:
+			with open(self.file_path, 'rb') as snapshot_file:
+				snapshot = pickle.load(snapshot_file)
+
+			# - Snapshots of other tool or ufoLib2 versions are discarded
+			if snapshot.get('version') == snapshot_version and snapshot.get('path') == self.ufo_path:
+				self.glyphs, self.groups, self.kerning = snapshot['glyphs'], snapshot['groups'], snapshot['kerning']
+
+		except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError):
+			pass
+
+	def read(self, data_name, file_name):
+		'''Pickled groups or kerning data, if the plist file is unchanged since the snapshot'''
+		record = getattr(self, data_name)
+		return record[1] if record is not None and record[0] == file_stamp(os.path.join(self.ufo_path, file_name)) else None
+
+	def update(self, data_name, file_name, data):
+		setattr(self, data_name, (file_stamp(os.path.join(self.ufo_path, file_name)), pickle.dumps(data, pickle.HIGHEST_PROTOCOL)))
+		self.modified = True
+
+	def save(self, glif_paths=None):
+		'''Write the snapshot if anything was parsed, dropping glyphs no longer in glif_paths'''
+		if not self.modified:
+			return
+
+		if glif_paths is not None:
+			self.glyphs = {glif_path:record for glif_path, record in self.glyphs.items() if glif_path in glif_paths}
+
+		os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+
+		# - Other sessions on the same sources write through temporary files of their own
+		with atomic_output(self.file_path) as temp_path:
+			with open(temp_path, 'wb') as snapshot_file:
+				pickle.dump({'version':snapshot_version, 'path':self.ufo_path, 'glyphs':self.glyphs, 'groups':self.groups, 'kerning':self.kerning}, snapshot_file, pickle.HIGHEST_PROTOCOL)
+
+		self.modified = False
+
+class snapshot_glyphset(object):
+	'''Glyph set of a lazily loaded layer: unchanged glyphs are read from the snapshot,
+	all others are parsed from their .glif file and added to the snapshot.'''
+	def __init__(self, glyph_set, ufo_path, snapshot):
+		self.glyph_set = glyph_set
+		self.glyph_path = os.path.join(os.path.abspath(ufo_path), glyph_set.dirName)
+		self.snapshot = snapshot
+
+	def __getattr__(self, name):
+		return getattr(self.glyph_set, name)
+
+	def glif_paths(self):
+		return [os.path.join(self.glyph_path, file_name) for file_name in self.glyph_set.contents.values()]
+
+	def readGlyph(self, glyph_name, glyph_object=None, pen=None, **kwargs):
+		glif_path = os.path.join(self.glyph_path, self.glyph_set.contents[glyph_name])
+		glif_stamp = file_stamp(glif_path)
+		record = self.snapshot.glyphs.get(glif_path)
+
+		if record is not None and record[:2] == (glif_stamp, glyph_name):
+			glyph_object.__setstate__(pickle.loads(record[2]).__getstate__())
+		else:
+			self.glyph_set.readGlyph(glyph_name, glyph_object, pen, **kwargs)
+			self.snapshot.glyphs[glif_path] = (glif_stamp, glyph_name, pickle.dumps(glyph_object, pickle.HIGHEST_PROTOCOL))
+			self.snapshot.modified = True
+
+class subs_engine(object):
+	'''Batch substitution pair builder for whole glyph name lists. Ignored words, ignored glyphs
+	and special words are compiled once into a regex and sets, the names are spaced out and
+	run through the replace_dict passes all at once. Gives the same pairs as str_process.'''
+	def __init__(self):
+		self.ignored_match = re.compile('|'.join(re.escape(word) for word in ignored_words)).search if len(ignored_words) else None
+		self.ignored_glyphs = set(ignored_glyphs)
+		self.special_words = set(special_words)
+		self.liga_word = liga_mark[1].strip()
+
+		# - Same as str_process name by name if the liga mark is spaced out as a whole word 
+		# - and no replacement involves the newlines that separate the names
+		replace_items = list(replace_dict.keys()) + list(replace_dict.values()) + [self.liga_word]
+		self.batch = len(liga_mark[0]) == 1 and liga_mark[1] == ' {} '.format(self.liga_word) and not any('\n' in item for item in replace_items)
+		
+		# - ... and no name has whitespace or repeated liga marks, which are spaced out differently
+		self.batch_unsafe = re.compile('{0}{0}|[^\\S\n]'.format(re.escape(liga_mark[0]))).search
+
+	def str_process(self, strings, ignore_liga_mark=True):
+		'''str_process of a whole list of strings'''
+		if not self.batch or not len(strings):
+			return [str_process(string, ignore_liga_mark) for string in strings]
+
+		batch_strings = [string[1:] if string[0] == liga_mark[0] and ignore_liga_mark else string for string in strings]
+		batch_string = '\n'.join(batch_strings)
+
+		if batch_string.count('\n') != len(strings) - 1 or self.batch_unsafe(batch_string) is not None:
+			return [str_process(string, ignore_liga_mark) for string in strings]
+
+		# - Spaced out as one string, unless empty names would leave spaces between the newlines
+		if '\n\n' in batch_string or batch_string.startswith('\n') or batch_string.endswith('\n') or not len(batch_string):
+			batch_string = '\n'.join([' '.join(string) for string in batch_strings])
+		else:
+			batch_string = ' '.join(batch_string).replace(' \n ', '\n')
+
+		return strRepDict(batch_string.replace(liga_mark[0], self.liga_word), replace_dict).split('\n')
+
+	def filter(self, glyph_names, items=None):
+		'''Items (default: the glyph names themselves) of the glyph names not ignored'''
+		glyph_items = [(glyph_name, item) for glyph_name, item in zip(glyph_names, glyph_names if items is None else items) if glyph_name not in self.ignored_glyphs]
+
+		# - Ignored words are searched for in all names at once first, a match can not span two names
+		if self.ignored_match is not None:
+			if any('\n' in word for word in ignored_words) or self.ignored_match('\n'.join([glyph_name for glyph_name, item in glyph_items])) is not None:
+				glyph_items = [(glyph_name, item) for glyph_name, item in glyph_items if self.ignored_match(glyph_name) is None]
+
+		return [item for glyph_name, item in glyph_items]
+
+	def escape_all(self, glyph_names):
+		return [glyph_name if glyph_name not in self.special_words else '\\' + glyph_name for glyph_name in glyph_names]
+
+	def pairs_for_glyphnames(self, glyphnames):
+		glyph_names = self.filter(glyphnames)
+		return list(zip(self.str_process(glyph_names), self.escape_all(glyph_names)))
+
+	def pairs_from_pairlist(self, pairlist, glyph_check_list):
+		glyph_check_set = set(glyph_check_list)
+		glyph_pairs = [(subst_in, subst_out) for subst_in, subst_out in pairlist if subst_out in glyph_check_set]
+		glyph_pairs = self.filter([subst_in for subst_in, subst_out in glyph_pairs], glyph_pairs)
+		return list(zip(self.str_process([subst_in for subst_in, subst_out in glyph_pairs], False), self.escape_all([subst_out for subst_in, subst_out in glyph_pairs])))
+
+class repl_prompt(object):
+	'''Interactive prompt, prefixed with the current status text (if any)'''
+	def __init__(self, prompt, status):
+		self.prompt = prompt
+		self.status = status
+
+	def __str__(self):
+		return self.status() + self.prompt
+
+class source_cache(object):
+	'''Designspace sources as lazily loaded ufoLib2 fonts, accessed by source name or index.
+	Glyphs are parsed on first access. Only the cache_size most recently used sources
+	are kept open, older ones are closed and dropped - keep no references to them.
+	With a snapshot_folder, parsed glyphs, groups and kerning are kept on disk between
+	sessions, only the files changed since are parsed again.
+	Preloaded sources are loaded on background threads, accessing one of them
+	waits only until that source is ready. Clearing the cache stops the background parsing.'''
+	def __init__(self, designspace, cache_size=2, snapshot_folder=None):
+		self.cache_size = max(1, cache_size)
+		self.snapshot_folder = snapshot_folder
+		self.paths = OrderedDict()
+		self.fonts = OrderedDict()
+		self.snapshots = {}
+		self.futures = OrderedDict()
+		self.progress = {}
+		self.executor = None
+		self.stopping = False
+
+		for source in designspace.sources:
+			self.paths[source.name or os.path.splitext(os.path.basename(source.path))[0]] = source.path
+
+		self.names = list(self.paths.keys())
+
+	def __len__(self):
+		return len(self.names)
+
+	def __iter__(self):
+		for name in self.names:
+			yield self[name]
+
+	def __contains__(self, name):
+		return name in self.paths
+
+	def __getitem__(self, key):
+		name = self.names[key] if isinstance(key, int) else key
+
+		if name in self.fonts:
+			self.fonts.move_to_end(name)
+		else:
+			load_future = self.futures.pop(name, None)
+			self.fonts[name] = load_future.result() if load_future is not None else self.load(name)
+
+			while len(self.fonts) > self.cache_size:
+				self.evict(next(iter(self.fonts)))
+
+		return self.fonts[name]
+
+	def __repr__(self):
+		'''Sources: * open, + preloaded, ~ loading in the background'''
+		source_mark = lambda name: '*' if name in self.fonts else ('+' if self.futures[name].done() else '~') if name in self.futures else ' '
+		return '\n'.join('{} {:30s}\t{}'.format(source_mark(name), name, self.paths[name]) for name in self.names)
+
+	def load(self, name):
+		ufo_path = self.paths[name]
+
+		# - Zipped UFOs have no per glyph files to check against a snapshot
+		if self.snapshot_folder is None or not snapshot_support or not os.path.isdir(ufo_path):
+			return ufoLib2.Font.open(ufo_path, lazy=True)
+
+		try:
+			return self.load_snapshot(name)
+
+		# - ufoLib2 internals changed in a way snapshot_support does not catch
+		except (AttributeError, TypeError):
+			self.snapshots.pop(name, None)
+			return ufoLib2.Font.open(ufo_path, lazy=True)
+
+	def load_snapshot(self, name):
+		ufo_path = self.paths[name]
+
+		snapshot = source_snapshot(ufo_path, self.snapshot_folder)
+		reader = UFOReader(ufo_path)
+		snapshot_data = {}
+
+		for data_name, file_name in (('groups', 'groups.plist'), ('kerning', 'kerning.plist')):
+			snapshot_data[data_name] = snapshot.read(data_name, file_name)
+
+			if snapshot_data[data_name] is not None:
+				setattr(reader, 'read' + data_name.title(), lambda data=snapshot_data[data_name]: pickle.loads(data))
+
+		font = ufoLib2.Font.read(reader, lazy=True)
+		font._path = ufo_path
+
+		for data_name, file_name in (('groups', 'groups.plist'), ('kerning', 'kerning.plist')):
+			if snapshot_data[data_name] is None:
+				snapshot.update(data_name, file_name, dict(getattr(font, data_name)))
+
+		for layer_name in font.layers.layerOrder:
+			layer = font.layers[layer_name]
+			layer._glyphSet = snapshot_glyphset(layer._glyphSet, ufo_path, snapshot)
+
+		self.snapshots[name] = snapshot
+		return font
+
+	def preload(self, names, workers=2):
+		'''Load and parse all glyphs of the given sources on background threads'''
+		if self.executor is None:
+			self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+
+		for name in names:
+			if name not in self.fonts and name not in self.futures:
+				self.progress[name] = [0, 0]
+				self.futures[name] = self.executor.submit(self._preload, name)
+
+	def _preload(self, name):
+		font = self.load(name)
+		layers = [font.layers[layer_name] for layer_name in font.layers.layerOrder]
+		self.progress[name][1] = sum(len(layer) for layer in layers)
+
+		for layer in layers:
+			for glyph_name in layer.keys():
+				if self.stopping:
+					return font
+
+				layer[glyph_name]
+				self.progress[name][0] += 1
+
+		return font
+
+	def status(self):
+		'''Background loading progress, empty once all preloaded sources are ready'''
+		if all(load_future.done() for load_future in self.futures.values()):
+			return ''
+
+		# - Accessed sources leave the futures but are still counted as preloaded,
+		# - the glyph count of a source is known only once it is opened
+		source_done = lambda name: name not in self.futures or self.futures[name].done()
+		source_parsed = [1. if source_done(name) else float(parsed) / max(total, 1) for name, (parsed, total) in self.progress.items()]
+		return '[{}/{} sources; {:.0%}] '.format(sum(map(source_done, self.progress)), len(self.progress), sum(source_parsed) / len(source_parsed))
+
+	def save_snapshot(self, name):
+		if name in self.snapshots and name in self.fonts:
+			layers = [self.fonts[name].layers[layer_name] for layer_name in self.fonts[name].layers.layerOrder]
+			self.snapshots[name].save(set(glif_path for layer in layers if isinstance(layer._glyphSet, snapshot_glyphset) for glif_path in layer._glyphSet.glif_paths()))
+
+	def evict(self, name):
+		if name in self.fonts:
+			self.save_snapshot(name)
+			self.snapshots.pop(name, None)
+			self.fonts.pop(name).close()
+
+	def clear(self):
+		# - Sources preloaded but never accessed still get their snapshots saved, for the glyphs parsed so far
+		self.stopping = True
+
+		if self.executor is not None:
+			self.executor.shutdown(wait=True, cancel_futures=True)
+
+		for name, load_future in list(self.futures.items()):
+			if not load_future.cancelled() and load_future.exception() is None:
+				self.fonts[name] = load_future.result()
+
+		self.futures.clear()
+		self.progress.clear()
+
+		for name in list(self.fonts.keys()):
+			self.evict(name)
+
 # --- Functions ---------------------------------------------
+@contextmanager
+def atomic_output(file_path):
+	''' Temporary file next to file_path, moved over it only once the block completes.
+	A failed write removes the temporary file and leaves any existing file_path untouched.'''
+	temp_handle, temp_path = tempfile.mkstemp(prefix='.{}.'.format(os.path.basename(file_path)), suffix='.tmp', dir=os.path.dirname(os.path.abspath(file_path)))
+	os.close(temp_handle)
+
+	try:
+		yield temp_path
+
+		if os.path.exists(file_path):
+			shutil.copymode(file_path, temp_path)
+		else:
+			os.chmod(temp_path, 0o666 & ~file_umask)
+
+		os.replace(temp_path, file_path)
+
+	except BaseException:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+
+		raise
+
+def file_stamp(file_path):
+	try:
+		file_stat = os.stat(file_path)
+		return (file_stat.st_mtime_ns, file_stat.st_size)
+	
+	except OSError:
+		return None
+
 def cls():
 	os.system('cls' if os.name=='nt' else 'clear')
 
@@ -144,54 +504,78 @@ def list_filter(input_list, discard_list, check_index=None):
 		return [item for item in input_list if item[check_index] not in discard_list]
 
 def subs_pairs_for_glyphname(glyphnames):
-	# - Init
-	glyph_subs_pairs = []
-
-	# - Process
-	for glyph_name in glyphnames:
-		if glyph_name not in ignored_glyphs and not any([iw in glyph_name for iw in ignored_words]):
-			subst_string = str_process(glyph_name)
-			glyph_name = glyph_name if glyph_name not in special_words else '\\' + glyph_name
-			
-			addon_tuple = (subst_string, glyph_name)
-			glyph_subs_pairs.append(addon_tuple)
-
-	return glyph_subs_pairs
+	return subs_engine().pairs_for_glyphnames(glyphnames)
 
 def subs_pairs_from_pairlist(pairlist, glyph_check_list):
-	# - Init
-	glyph_subs_pairs = []
-
-	# - Process
-	for subst_in, subst_out in pairlist:
-		if subst_in not in ignored_glyphs and not any([iw in subst_in for iw in ignored_words]):
-			if subst_out in glyph_check_list:
-				addon_tuple = (str_process(subst_in, False), subst_out if subst_out not in special_words else '\\' + subst_out)
-				glyph_subs_pairs.append(addon_tuple)
-
-	return glyph_subs_pairs
+	return subs_engine().pairs_from_pairlist(pairlist, glyph_check_list)
 
 def sort_pairs(pairlist, len_index, alpha_index):
 	return sorted(pairlist, key=lambda i: (len(i[len_index]), i[alpha_index]))
 
-def fea_rlig(glyph_subs_pairs):
-	''' Generate a Required Ligatures OT Feature with given list of substitution tuples'''
+def fea_rlig_chunks(glyph_subs_pairs):
+	''' Required Ligatures OT Feature code for the given list of substitution tuples, piece by piece'''
 	feature_dict = {'tag': 'rlig', 'com':'GSUB feature: Required Ligatures'}
+	fea_prefix, fea_suffix = simple_fea.split('{body}')
 
-	# - Build Feature code
-	feature_body = []
 	#glyph_subs_pairs = sort_pairs(glyph_subs_pairs, 1, 1)
 	glyph_subs_pairs = sorted(glyph_subs_pairs, key=lambda i: (len(i[0].replace('underscore', '_')), i[0]))
-		
+	
 	# - Process font's glyphs
-	for subst_string, glyph_name in reversed(glyph_subs_pairs):
-		feature_body.append(simple_sub.format(**{'glyph_in':subst_string, 'glyph_out':glyph_name}))
+	yield fea_prefix.format(**feature_dict)
 
-	# - Build feature body
-	feature_dict['body'] = '\n'.join(feature_body)
-	feature_code = simple_fea.format(**feature_dict)
-		
-	return feature_code
+	# - Lines are yielded in blocks, so that no more than a block is held in memory at once
+	for i, block in enumerate(chunk_slicer(glyph_subs_pairs[::-1], fea_block_size)):
+		yield ('\n' if i else '') + '\n'.join([simple_sub.format(**{'glyph_in':subst_string, 'glyph_out':glyph_name}) for subst_string, glyph_name in block])
+
+	yield fea_suffix.format(**feature_dict)
+
+def fea_rlig(glyph_subs_pairs):
+	''' Generate a Required Ligatures OT Feature with given list of substitution tuples'''
+	return ''.join(fea_rlig_chunks(glyph_subs_pairs))
+
+def fea_hash(glyph_subs_pairs, font_name=''):
+	''' Hash of the font name, substitution tuples and the file templates, identifies a generated feature file'''
+	pairs_hash = hashlib.sha1('\n'.join([str(__version__), font_name, fea_head, simple_fea, simple_sub, fea_lang]).encode('utf-8'))
+
+	for subst_string, glyph_name in glyph_subs_pairs:
+		pairs_hash.update('{}\t{}\n'.format(subst_string, glyph_name).encode('utf-8'))
+
+	return pairs_hash.hexdigest()
+
+def fea_read_hash(file_path):
+	''' Glyph set hash recorded in the header comments of a feature file written by fea_rlig_write'''
+	try:
+		with open(file_path, 'r', encoding='utf-8') as fea_file:
+			for line in fea_file:
+				if not line.startswith('#'):
+					break
+
+				if line.startswith(fea_hash_comment):
+					return line[len(fea_hash_comment):].strip()
+
+	except (OSError, UnicodeDecodeError):
+		pass
+
+	return None
+
+def fea_rlig_write(file_path, glyph_subs_pairs, font_name='', force=False):
+	''' Write header, languagesystems and Required Ligatures feature straight to a *.fea file. 
+	The previous file is kept if it was generated for the same font name and glyph set, unless forced.
+	Returns True if the file was written.'''
+	glyph_set_hash = fea_hash(glyph_subs_pairs, font_name)
+
+	if not force and fea_read_hash(file_path) == glyph_set_hash:
+		return False
+
+	with atomic_output(file_path) as temp_path:
+		with open(temp_path, 'w', encoding='utf-8', buffering=1 << 20) as fea_file:
+			fea_file.write(fea_head.format(generator='{} {}'.format(tool_name, __version__), time=datetime.datetime.now().strftime("%d.%m.%Y-%H:%M:%S"), fontname=font_name))
+			fea_file.write('{}{}\n\n'.format(fea_hash_comment, glyph_set_hash))
+			fea_file.write(fea_lang + '\n')
+			fea_file.writelines(fea_rlig_chunks(glyph_subs_pairs))
+			fea_file.write('\n')
+
+	return True
 
 # - File related functions ---------------------------------------------
 def output(i, message, print_output=True):
@@ -214,6 +598,28 @@ arg_parser.add_argument('File',
 						metavar='Designspace',
 						help='Source UFO+Designspace file')
 
+arg_parser.add_argument('--cache-size', '-c',
+						type=int,
+						default=2,
+						metavar='N',
+						help='Keep up to N source UFOs loaded (default: 2)')
+
+arg_parser.add_argument('--preload', '-p',
+						type=int,
+						default=None,
+						metavar='N',
+						help='Load the first N sources on background threads (default: cache size; 0: none)')
+
+arg_parser.add_argument('--snapshot-path', '-s',
+						type=str,
+						default=snapshot_path,
+						metavar='path',
+						help='Folder of the parsed source snapshots (default: {})'.format(snapshot_path))
+
+arg_parser.add_argument('--no-snapshot', '-n',
+						action='store_true',
+						help='Parse all sources from their UFO files, without snapshots')
+
 # -- Parse arguments
 args = arg_parser.parse_args()
 
@@ -228,8 +634,25 @@ path_ufo, file_designspace = os.path.split(designspace_file)
 font = designspaceLib.DesignSpaceDocument()
 font.read(designspace_file)
 
+if not args.no_snapshot and not snapshot_support:
+	output(1,'Snapshots not supported with ufoLib2 {}; Sources are parsed on every start;'.format(ufoLib2.__version__))
+
+sources = source_cache(font, args.cache_size, None if args.no_snapshot else args.snapshot_path)
+atexit.register(sources.clear)
+
+# --- Sources are loaded in the background, the prompt shows the progress
+preload_names = sources.names[:min(args.cache_size if args.preload is None else args.preload, sources.cache_size)]
+
+if len(preload_names):
+	sources.preload(preload_names, len(preload_names))
+	sys.ps1 = repl_prompt(sys.ps1, sources.status)
+
 output(0,'Load: {};'.format(file_designspace))
 output(3,'Inspector call: {};\t Font Object: {};'.format('inspect_obj(object)', 'font'))
+output(3,'Sources: {}; Loaded on access: {};'.format(len(sources), "sources['name'] or sources[index]"))
+
+if len(preload_names):
+	output(2,'Loading in the background: {};'.format(', '.join(preload_names)))
 
 
 